@@ -0,0 +1,276 @@
+"""
+Export
+Builds deploy-ready copies of the scraper output
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import tarfile
+import time
+import zipfile
+from pathlib import Path
+
+HASH_LENGTH = 12
+
+# Headers file understood by Netlify, Cloudflare Pages and similar static hosts
+HEADERS_FILE = """/images/*
+  Cache-Control: public, max-age=31536000, immutable
+/summary.*.json
+  Cache-Control: public, max-age=31536000, immutable
+/summary.json
+  Cache-Control: public, max-age=0, must-revalidate
+/manifest.json
+  Cache-Control: public, max-age=0, must-revalidate
+"""
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """Return the hex SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hashed_name(name, digest):
+    """item_0001.webp -> item_0001.<hash>.webp"""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest[:HASH_LENGTH]}{ext}"
+
+
+def link_or_copy(src, dest):
+    """Hard-link src to dest when possible (no extra disk space), otherwise copy"""
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+
+def write_precompressed(path, data):
+    """Write data plus .gz (and .br if brotli is installed) siblings; returns written suffixes"""
+    path = Path(path)
+    path.write_bytes(data)
+    written = ['']
+
+    # mtime=0 keeps gzip output byte-identical across exports
+    with open(f"{path}.gz", 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=9, mtime=0) as gz:
+        gz.write(data)
+    written.append('.gz')
+
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+    if brotli is not None:
+        Path(f"{path}.br").write_bytes(brotli.compress(data, quality=11))
+        written.append('.br')
+    return written
+
+
+def export_static(output_dir, export_dir):
+    """Write a deploy-ready static copy of output_dir into export_dir.
+
+    Images get content-hashed filenames, summary.json is rewritten to point at them
+    and also published under a content-hashed name, and manifest.json maps item ids
+    to hashed URLs. JSON files are written pre-gzipped (and pre-brotli'd if the
+    brotli package is available) so hosts can serve them with minimal bytes.
+    """
+    output_dir = Path(output_dir)
+    export_dir = Path(export_dir)
+    images_dir = output_dir / "images"
+
+    with open(output_dir / "summary.json", 'r', encoding='utf-8') as f:
+        summary = json.load(f)
+
+    export_images_dir = export_dir / "images"
+    export_images_dir.mkdir(parents=True, exist_ok=True)
+
+    manifest_items = {}
+    exported = 0
+    missing = []
+    for item in summary.get('items', []):
+        filename = item.get('image_filename')
+        if not filename:
+            continue
+        src = images_dir / filename
+        if not src.exists():
+            missing.append(filename)
+            continue
+
+        target_name = hashed_name(filename, file_digest(src))
+        dest = export_images_dir / target_name
+        if not dest.exists():
+            link_or_copy(src, dest)
+            exported += 1
+        item['image_filename'] = target_name
+        manifest_items[str(item['id'])] = f"images/{target_name}"
+
+    summary_bytes = json.dumps(summary, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    summary_name = hashed_name("summary.json", hashlib.sha256(summary_bytes).hexdigest())
+    encodings = write_precompressed(export_dir / summary_name, summary_bytes)
+    write_precompressed(export_dir / "summary.json", summary_bytes)
+
+    manifest = {
+        'scrape_date': summary.get('scrape_date'),
+        'summary': summary_name,
+        'items': manifest_items,
+    }
+    manifest_bytes = json.dumps(manifest, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    write_precompressed(export_dir / "manifest.json", manifest_bytes)
+
+    (export_dir / "_headers").write_text(HEADERS_FILE, encoding='utf-8')
+
+    return {
+        'images': len(manifest_items),
+        'new_images': exported,
+        'missing': missing,
+        'summary': summary_name,
+        'encodings': encodings,
+    }
+
+
+ARCHIVE_FORMATS = ('zip', 'tar', 'tar.gz', 'tar.zst')
+LAST_ARCHIVE_FILE = "last_archive.json"
+
+
+def archive_format_for(destination):
+    """Infer the archive format from a destination filename, or None for a static export"""
+    name = str(destination).lower()
+    if name.endswith('.zip'):
+        return 'zip'
+    if name.endswith(('.tar.gz', '.tgz')):
+        return 'tar.gz'
+    if name.endswith(('.tar.zst', '.tzst')):
+        return 'tar.zst'
+    if name.endswith('.tar'):
+        return 'tar'
+    return None
+
+
+def parse_item_ids(spec):
+    """Parse '1,4,10-20' into a set of ids"""
+    ids = set()
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            ids.update(range(int(first), int(last) + 1))
+        else:
+            ids.add(int(part))
+    return ids
+
+
+def item_time(item):
+    """Item timestamp (YYYYMMDD_HHMMSS) as a sortable 'YYYY-MM-DD HH:MM:SS' string"""
+    ts = item.get('timestamp') or ''
+    if len(ts) != 15:
+        return ''
+    return f"{ts[0:4]}-{ts[4:6]}-{ts[6:8]} {ts[9:11]}:{ts[11:13]}:{ts[13:15]}"
+
+
+def select_items(items, since=None, until=None, query=None, ids=None, after=None):
+    """Filter summary items by date range ('YYYY-MM-DD[ HH:MM:SS]'), prompt substring and ids.
+
+    `after` is an exclusive lower bound, used for incremental archives.
+    """
+    query = query.lower() if query else None
+    selected = []
+    for item in items:
+        when = item_time(item)
+        if since and when < since:
+            continue
+        if after and when <= after:
+            continue
+        # A bare date as upper bound includes that whole day
+        if until and when > (until + ' 23:59:59' if len(until) == 10 else until):
+            continue
+        if query and query not in (item.get('prompt') or '').lower():
+            continue
+        if ids is not None and item['id'] not in ids:
+            continue
+        selected.append(item)
+    return selected
+
+
+class ArchiveWriter:
+    """Streams files into a zip or (compressed) tar on a file or non-seekable stream"""
+
+    def __init__(self, fileobj, fmt):
+        self.fmt = fmt
+        self.compressor_stream = None
+        if fmt == 'zip':
+            self.archive = zipfile.ZipFile(fileobj, mode='w', allowZip64=True)
+        elif fmt == 'tar.zst':
+            try:
+                import zstandard
+            except ImportError:
+                raise RuntimeError("tar.zst archives need the zstandard package (pip install zstandard)")
+            self.compressor_stream = zstandard.ZstdCompressor(level=10, threads=-1).stream_writer(fileobj, closefd=False)
+            self.archive = tarfile.open(fileobj=self.compressor_stream, mode='w|')
+        else:
+            mode = {'tar': 'w|', 'tar.gz': 'w|gz'}[fmt]
+            self.archive = tarfile.open(fileobj=fileobj, mode=mode)
+
+    def add_file(self, path, arcname):
+        if self.fmt == 'zip':
+            # Images are already compressed; storing them avoids wasted CPU
+            compress = zipfile.ZIP_DEFLATED if arcname.endswith('.json') else zipfile.ZIP_STORED
+            self.archive.write(path, arcname, compress_type=compress)
+        else:
+            self.archive.add(path, arcname, recursive=False)
+
+    def add_bytes(self, data, arcname):
+        if self.fmt == 'zip':
+            self.archive.writestr(arcname, data, compress_type=zipfile.ZIP_DEFLATED)
+        else:
+            info = tarfile.TarInfo(arcname)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self.archive.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        self.archive.close()
+        if self.compressor_stream is not None:
+            self.compressor_stream.close()
+
+
+def export_archive(output_dir, fileobj, fmt, items, scrape_date=None, root='sora-library'):
+    """Stream the selected items' images, prompt files and a matching summary.json into an archive.
+
+    Files are read straight from output_dir; nothing is staged on disk. Returns counts.
+    """
+    output_dir = Path(output_dir)
+    images_dir = output_dir / "images"
+    prompts_dir = output_dir / "prompts"
+
+    writer = ArchiveWriter(fileobj, fmt)
+    counts = {'items': len(items), 'images': 0, 'prompts': 0, 'bytes': 0, 'missing': 0}
+    try:
+        for item in items:
+            filename = item.get('image_filename')
+            if filename:
+                path = images_dir / filename
+                if path.exists():
+                    writer.add_file(path, f"{root}/images/{filename}")
+                    counts['images'] += 1
+                    counts['bytes'] += path.stat().st_size
+                else:
+                    counts['missing'] += 1
+            if item.get('timestamp'):
+                prompt_path = prompts_dir / f"item_{item['id']:04d}_{item['timestamp']}.json"
+                if prompt_path.exists():
+                    writer.add_file(prompt_path, f"{root}/prompts/{prompt_path.name}")
+                    counts['prompts'] += 1
+
+        summary = {'total_items': len(items), 'scrape_date': scrape_date, 'items': items}
+        writer.add_bytes(json.dumps(summary, indent=2, ensure_ascii=False).encode('utf-8'), f"{root}/summary.json")
+    finally:
+        writer.close()
+    return counts
@@ -0,0 +1,223 @@
+"""
+Extraction
+Selector chains and browser-independent helpers shared by the live scraper and
+the offline snapshot re-parser
+"""
+
+import json
+import os
+
+BASE_URL = 'https://sora.chatgpt.com'
+
+# Library page: clickable items linking to detail pages ("g/gen" in the URL)
+LINK_SELECTORS = [
+    'a[href*="/g/gen"]',
+    'a[href*="g/gen"]',
+    'a[href*="/library/"]',
+    'a[href*="/detail"]',
+    'article a',
+    '[data-testid*="library"] a',
+    '[data-testid*="card"] a',
+    '.library-item a',
+    'div[role="article"] a',
+]
+
+# Detail page: elements holding the prompt text
+PROMPT_SELECTORS = [
+    'p[class*="prompt"]',
+    'div[class*="prompt"]',
+    'div[class*="text"]',
+    'p',
+    'span[class*="prompt"]',
+    '[data-testid*="prompt"]',
+]
+
+# Detail page: buttons whose text may be the (full) prompt
+PROMPT_BUTTON_SELECTORS = [
+    'button:has-text("prompt")',
+    'button[aria-label*="prompt" i]',
+    'button[data-testid*="prompt"]',
+    'button',
+]
+
+PROMPT_BUTTON_SKIP_PREFIXES = ('click', 'download', 'save', 'share', 'copy')
+PAGE_TEXT_SKIP_WORDS = ['menu', 'navigation', 'header', 'footer', 'cookie']
+IMAGE_SRC_ATTRIBUTES = ['src', 'data-src', 'data-url', 'data-original', 'data-lazy-src']
+
+# Detail page: ways to locate the generated image, in fallback order
+IMAGE_STRATEGIES = ['alt_exact', 'alt_contains', 'largest']
+
+# Detail page: prompt extraction paths, in fallback order ("stage:selector")
+PROMPT_STRATEGIES = (
+    [f'element:{selector}' for selector in PROMPT_SELECTORS]
+    + [f'button:{selector}' for selector in PROMPT_BUTTON_SELECTORS]
+    + ['page_text']
+)
+
+# Chain entries that match on almost any page. They stay in the fallback chains but are
+# never remembered as winners, since trying them first would shadow the precise ones.
+GENERIC_CANDIDATES = frozenset({
+    'article a', 'div[role="article"] a', '[data-testid*="card"] a',
+    'element:p', 'element:div[class*="text"]', 'button:button', 'page_text',
+    'srcset',
+})
+
+# Find the button following a prompt element (next siblings, then the parent's next siblings)
+NEXT_BUTTON_SCRIPT = '''
+    (element) => {
+        let current = element.nextElementSibling;
+        while (current) {
+            if (current.tagName === 'BUTTON') {
+                return current.innerText || current.textContent || '';
+            }
+            current = current.nextElementSibling;
+        }
+        // Try parent's next sibling
+        if (element.parentElement) {
+            current = element.parentElement.nextElementSibling;
+            while (current) {
+                if (current.tagName === 'BUTTON') {
+                    return current.innerText || current.textContent || '';
+                }
+                current = current.nextElementSibling;
+            }
+        }
+        return null;
+    }
+'''
+
+
+def absolute_url(url):
+    """Resolve protocol-relative and site-relative URLs against the Sora origin"""
+    if url.startswith('//'):
+        return 'https:' + url
+    if url.startswith('/'):
+        return BASE_URL + url
+    if not url.startswith('http'):
+        return BASE_URL + '/' + url.lstrip('/')
+    return url
+
+
+def normalize_detail_url(url):
+    """Detail page URL without fragment, query string or trailing slash"""
+    return url.split('#')[0].split('?')[0].rstrip('/')
+
+
+def is_prompt_button_text(text):
+    """Buttons with longer descriptive text (not actions) may hold the prompt"""
+    return bool(text) and 20 < len(text) < 2000 and not text.lower().startswith(PROMPT_BUTTON_SKIP_PREFIXES)
+
+
+def longest_prompt_line(body_text):
+    """Fallback: the longest paragraph-like line of the page text, or None"""
+    lines = [line.strip() for line in body_text.split('\n') if line.strip()]
+    for line in sorted(lines, key=len, reverse=True):
+        if len(line) > 20 and len(line) < 2000:
+            if not any(skip in line.lower() for skip in PAGE_TEXT_SKIP_WORDS):
+                return line
+    return None
+
+
+def pick_srcset_url(srcset):
+    """Choose a URL from a srcset, preferring the widest WebP; returns (url, description)"""
+    srcset_parts = srcset.split(',')
+    webp_urls = []
+    largest_webp_url = None
+    largest_webp_width = 0
+
+    for part in srcset_parts:
+        part = part.strip()
+        parts = part.split()
+        url_part = parts[0] if len(parts) > 0 else part
+        # Try to get width descriptor
+        width = 0
+        if len(parts) > 1:
+            width_str = parts[1]
+            if width_str.endswith('w'):
+                try:
+                    width = int(width_str[:-1])
+                except ValueError:
+                    pass
+
+        # Collect WebP URLs with their sizes
+        if '.webp' in url_part.lower():
+            if width > largest_webp_width:
+                largest_webp_width = width
+                largest_webp_url = url_part
+            webp_urls.append((url_part, width))
+
+    # Use largest WebP URL, or first WebP, or last URL as fallback
+    if largest_webp_url:
+        return largest_webp_url, f"largest WebP in srcset ({largest_webp_width}w)"
+    if webp_urls:
+        webp_urls.sort(key=lambda x: x[1], reverse=True)
+        return webp_urls[0][0], "WebP in srcset"
+    if srcset_parts and srcset_parts[-1].strip():
+        return srcset_parts[-1].strip().split()[0], None
+    return None, None
+
+
+def image_extension(url):
+    """File extension for a downloaded image URL (WebP preferred when detected)"""
+    url = url.lower()
+    if '.webp' in url:
+        return '.webp'
+    if '.png' in url:
+        return '.png'
+    if '.gif' in url:
+        return '.gif'
+    return '.jpg'
+
+
+class SelectorCache:
+    """Remembers which entry of each fallback chain last succeeded, persisted across runs.
+
+    order() puts the last winner first and keeps the rest in their original
+    order, so a miss still falls back through the full chain. Catch-all entries
+    (GENERIC_CANDIDATES) are never recorded as winners.
+    """
+
+    def __init__(self, path=None, save_every=25):
+        self.path = path
+        self.save_every = save_every
+        self.unsaved = 0
+        self.chains = {}
+        if path is not None:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.chains = json.load(f)
+            except (OSError, ValueError):
+                self.chains = {}
+
+    def best(self, chain, candidates=None):
+        """Last successful candidate of a chain (None if unknown or no longer a candidate)"""
+        last = self.chains.get(chain, {}).get('last')
+        # Cache files from older versions may name a catch-all
+        if last in GENERIC_CANDIDATES or (candidates is not None and last not in candidates):
+            return None
+        return last
+
+    def order(self, chain, candidates):
+        best = self.best(chain, candidates)
+        if best is None:
+            return list(candidates)
+        return [best] + [candidate for candidate in candidates if candidate != best]
+
+    def record(self, chain, candidate):
+        if candidate in GENERIC_CANDIDATES:
+            return
+        entry = self.chains.setdefault(chain, {'last': None, 'hits': {}})
+        entry['last'] = candidate
+        entry['hits'][candidate] = entry['hits'].get(candidate, 0) + 1
+        self.unsaved += 1
+        if self.unsaved >= self.save_every:
+            self.save()
+
+    def save(self):
+        if self.path is None or not self.unsaved:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.chains, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self.unsaved = 0
@@ -0,0 +1,277 @@
+"""
+Image Index
+Perceptual hashes (dHash) for downloaded images and a multi-index hash table for
+fast Hamming-distance queries, used to find near-duplicate generations
+"""
+
+import json
+import os
+from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+HASH_BITS = 64
+DEFAULT_MAX_DISTANCE = 6  # dHash bits that may differ for two images to count as near-duplicates
+HASH_CACHE_FILE = "image_hashes.json"
+NEIGHBOURS_CACHE_FILE = "image_neighbours.json"
+
+
+def dhash(path, hash_size=8):
+    """Compute a 64-bit difference hash of an image file (requires Pillow)"""
+    from PIL import Image
+
+    with Image.open(path) as img:
+        # Grayscale, one extra column so each row yields hash_size left/right comparisons
+        small = img.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+        pixels = list(small.getdata())
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return value
+
+
+def _hash_file(path):
+    """Process pool task: returns (filename, hash or None if the file cannot be decoded)"""
+    try:
+        return Path(path).name, dhash(path)
+    except (ImportError, MemoryError):
+        # Environment problems must not be cached as undecodable images
+        raise
+    except Exception:
+        return Path(path).name, None
+
+
+def hash_images(images_dir, cache_dir=None, workers=None):
+    """Hash every image in images_dir, reusing cached hashes for unchanged files.
+
+    Returns {filename: hash}. The cache is stored as image_hashes.json in cache_dir
+    (default: parent of images_dir) so later runs only hash new or modified files.
+    """
+    images_dir = Path(images_dir)
+    cache_file = Path(cache_dir or images_dir.parent) / HASH_CACHE_FILE
+
+    cache = {}
+    if cache_file.exists():
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+
+    hashes = {}
+    fresh_cache = {}
+    todo = []
+    for entry in (os.scandir(images_dir) if images_dir.exists() else []):
+        if not entry.is_file():
+            continue
+        stat = entry.stat()
+        cached = cache.get(entry.name)
+        # Failed entries are only trusted when they record a decode error
+        if (cached and cached.get('size') == stat.st_size and cached.get('mtime') == stat.st_mtime
+                and (cached.get('hash') is not None or cached.get('error'))):
+            fresh_cache[entry.name] = cached
+            if cached.get('hash') is not None:
+                hashes[entry.name] = int(cached['hash'], 16)
+        else:
+            todo.append(entry)
+
+    if todo:
+        # Fail here (ImportError) rather than inside the pool, where it would look like bad images
+        import PIL
+
+        paths = [entry.path for entry in todo]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_hash_file, paths, chunksize=max(1, len(paths) // ((os.cpu_count() or 1) * 4))))
+        for entry, (name, value) in zip(todo, results):
+            stat = entry.stat()
+            fresh_cache[name] = {
+                'hash': f"{value:016x}" if value is not None else None,
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+            }
+            if value is None:
+                fresh_cache[name]['error'] = "undecodable"
+            if value is not None:
+                hashes[name] = value
+
+    if todo or len(fresh_cache) != len(cache):
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump(fresh_cache, f)
+
+    return hashes
+
+
+class MultiIndexHash:
+    """Hamming-distance index over 64-bit hashes using multi-index hashing.
+
+    Each hash is split into NUM_CHUNKS disjoint 16-bit chunks. By the pigeonhole
+    principle, two hashes within max_distance bits differ in at most
+    max_distance // NUM_CHUNKS bits on at least one chunk, so a query only probes
+    the chunk values within that small radius. With 16-bit chunks the probed
+    buckets stay nearly empty even for large libraries.
+    """
+
+    NUM_CHUNKS = 4
+
+    def __init__(self, max_distance=DEFAULT_MAX_DISTANCE, bits=HASH_BITS):
+        self.max_distance = max_distance
+        self.bits = bits
+        width = bits // self.NUM_CHUNKS
+        self.chunks = [(i * width, (1 << width) - 1) for i in range(self.NUM_CHUNKS)]
+        self.radius = max_distance // self.NUM_CHUNKS
+        # XOR masks of every chunk value within the probe radius (including 0)
+        self.probes = [0]
+        for flips in range(1, self.radius + 1):
+            self.probes.extend(sum(1 << bit for bit in combo) for combo in combinations(range(width), flips))
+        self.tables = [{} for _ in self.chunks]
+        self.hashes = {}
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, key, value):
+        self.hashes[key] = value
+        for table, (shift, mask) in zip(self.tables, self.chunks):
+            table.setdefault((value >> shift) & mask, []).append(key)
+
+    def query(self, value, max_distance=None):
+        """Return [(key, distance)] for all indexed hashes within max_distance, nearest first"""
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        seen = set()
+        matches = []
+        for table, (shift, mask) in zip(self.tables, self.chunks):
+            chunk = (value >> shift) & mask
+            for probe in self.probes:
+                for key in table.get(chunk ^ probe, ()):
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    distance = (self.hashes[key] ^ value).bit_count()
+                    if distance <= max_distance:
+                        matches.append((key, distance))
+        matches.sort(key=lambda match: match[1])
+        return matches
+
+    def pairs(self, max_distance=None):
+        """Yield (key, other_key, distance) once for every pair within max_distance.
+
+        Pairs are taken from bucket mates and from buckets within the probe radius,
+        so no per-key query over the whole index is needed.
+        """
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        found = set()
+        hashes = self.hashes
+        for table in self.tables:
+            for chunk, members in table.items():
+                # Each pair of buckets is visited once: probe only towards larger chunk values
+                others = [table[chunk ^ probe] for probe in self.probes[1:]
+                          if chunk ^ probe > chunk and chunk ^ probe in table]
+                for i, key in enumerate(members):
+                    value = hashes[key]
+                    candidates = members[i + 1:]
+                    for bucket in others:
+                        candidates = candidates + bucket
+                    for other in candidates:
+                        distance = (hashes[other] ^ value).bit_count()
+                        if distance <= max_distance:
+                            # The same pair can agree on several chunks
+                            pair = (key, other) if key < other else (other, key)
+                            if pair not in found:
+                                found.add(pair)
+                                yield key, other, distance
+
+    def neighbours(self, max_distance=None):
+        """Return {key: [(other_key, distance), ...]} (nearest first) for keys with near-duplicates"""
+        result = {}
+        for key, other, distance in self.pairs(max_distance):
+            result.setdefault(key, []).append((other, distance))
+            result.setdefault(other, []).append((key, distance))
+        for matches in result.values():
+            matches.sort(key=lambda match: (match[1], match[0]))
+        return result
+
+    def groups(self, max_distance=None):
+        """Group keys into connected clusters of near-duplicates (singletons omitted)"""
+        parent = {key: key for key in self.hashes}
+
+        def find(key):
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        for key, other, _ in self.pairs(max_distance):
+            root_a, root_b = find(key), find(other)
+            if root_a != root_b:
+                parent[root_b] = root_a
+
+        clusters = {}
+        for key in self.hashes:
+            clusters.setdefault(find(key), []).append(key)
+        return [sorted(members) for members in clusters.values() if len(members) > 1]
+
+
+def build_index(hashes, max_distance=DEFAULT_MAX_DISTANCE):
+    """Build a MultiIndexHash from a {filename: hash} mapping"""
+    index = MultiIndexHash(max_distance=max_distance)
+    for name, value in hashes.items():
+        index.add(name, value)
+    return index
+
+
+def cached_neighbours(hashes, cache_dir, max_distance=DEFAULT_MAX_DISTANCE):
+    """neighbours() for a {filename: hash} mapping, updated incrementally from the last result.
+
+    The result is kept in image_neighbours.json in cache_dir together with the hashes
+    it was computed from; later calls only query images that were added, changed or
+    removed since, so repeated summary writes stay cheap on large libraries.
+    """
+    cache_file = Path(cache_dir) / NEIGHBOURS_CACHE_FILE
+    cache = None
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        if cache.get('max_distance') != max_distance:
+            cache = None
+    except (OSError, ValueError):
+        cache = None
+
+    if cache is None:
+        neighbours = build_index(hashes, max_distance=max_distance).neighbours()
+    else:
+        old_hashes = {name: int(value, 16) for name, value in cache['hashes'].items()}
+        changed = {name for name, value in hashes.items() if old_hashes.get(name) != value}
+        changed.update(name for name in old_hashes if name not in hashes)
+        neighbours = {}
+        for name, matches in cache['neighbours'].items():
+            if name in changed:
+                continue
+            kept = [(other, distance) for other, distance in matches if other not in changed]
+            if kept:
+                neighbours[name] = kept
+        if not changed:
+            return neighbours
+
+        index = build_index(hashes, max_distance=max_distance)
+        for name in changed:
+            if name not in hashes:
+                continue
+            for other, distance in index.query(hashes[name]):
+                if other == name:
+                    continue
+                neighbours.setdefault(name, []).append((other, distance))
+                if other not in changed:
+                    neighbours.setdefault(other, []).append((name, distance))
+        for matches in neighbours.values():
+            matches.sort(key=lambda match: (match[1], match[0]))
+
+    with open(cache_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'max_distance': max_distance,
+            'hashes': {name: f"{value:016x}" for name, value in hashes.items()},
+            'neighbours': neighbours,
+        }, f)
+    return neighbours
@@ -0,0 +1,165 @@
+"""
+Integrity
+Parallel verification of downloaded images against summary.json and the prompt files
+"""
+
+import hashlib
+import json
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+
+def detect_format(data):
+    """Identify an image format from its first bytes"""
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    if data[:3] == b'\xff\xd8\xff':
+        return 'jpeg'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    return None
+
+
+def check_structure(data, fmt):
+    """Return an error string if the file is visibly truncated, else None"""
+    if fmt == 'png':
+        # Last chunk must be IEND (+ 4 byte CRC)
+        if data[-12:-4] != b'\x00\x00\x00\x00IEND':
+            return 'truncated (no PNG IEND chunk)'
+    elif fmt == 'jpeg':
+        # Allow trailing padding after the end-of-image marker
+        if data.rfind(b'\xff\xd9', max(0, len(data) - 1024)) < 0:
+            return 'truncated (no JPEG EOI marker)'
+    elif fmt == 'webp':
+        riff_size = int.from_bytes(data[4:8], 'little')
+        if riff_size + 8 > len(data):
+            return f'truncated (RIFF says {riff_size + 8} bytes, file has {len(data)})'
+    elif fmt == 'gif':
+        if data[-1:] != b';':
+            return 'truncated (no GIF trailer)'
+    return None
+
+
+def check_image(path, decode=False):
+    """Hash and header-check one image file using a memory-mapped read.
+
+    Returns a dict with name, size, sha256, format and error (None if the file is ok).
+    """
+    result = {'name': os.path.basename(path), 'size': 0, 'sha256': None, 'format': None, 'error': None}
+    try:
+        size = os.path.getsize(path)
+        result['size'] = size
+        if size == 0:
+            result['error'] = 'empty file'
+            return result
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            result['sha256'] = hashlib.sha256(data).hexdigest()
+            result['format'] = detect_format(data[:16])
+            if result['format'] is None:
+                result['error'] = 'unknown or corrupt image header'
+                return result
+            result['error'] = check_structure(data, result['format'])
+        if decode and result['error'] is None:
+            from PIL import Image
+            with Image.open(path) as img:
+                img.load()
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    return result
+
+
+def _check_image_task(args):
+    return check_image(*args)
+
+
+def check_images(paths, workers=None, decode=False):
+    """Check many images across a process pool; returns results in input order"""
+    paths = list(paths)
+    if not paths:
+        return []
+    chunksize = max(1, min(256, len(paths) // ((os.cpu_count() or 1) * 4)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_check_image_task, ((str(p), decode) for p in paths), chunksize=chunksize))
+
+
+def verify_library(output_dir, workers=None, decode=False):
+    """Cross-check images and prompt files against summary.json.
+
+    Returns a report dict:
+      missing        items whose image file does not exist
+      corrupt        items whose image file is empty, truncated or undecodable
+      prompt_drift   items whose prompt file disagrees with the summary
+      untracked      image or prompt files no summary item refers to
+      checked        number of image files checked
+    Each problem entry carries the item (id, detail_url) so it can be re-queued.
+    Raises ImportError if decode is set and Pillow is not installed.
+    """
+    if decode:
+        # Checked once up front; otherwise every image would be reported as corrupt
+        import PIL
+
+    output_dir = Path(output_dir)
+    images_dir = output_dir / "images"
+    prompts_dir = output_dir / "prompts"
+
+    with open(output_dir / "summary.json", 'r', encoding='utf-8') as f:
+        summary = json.load(f)
+    items = summary.get('items', [])
+
+    on_disk = {entry.name for entry in os.scandir(images_dir) if entry.is_file()} if images_dir.exists() else set()
+    report = {'missing': [], 'corrupt': [], 'prompt_drift': [], 'untracked': [], 'checked': 0}
+
+    by_filename = {}
+    for item in items:
+        filename = item.get('image_filename')
+        if not filename:
+            continue
+        if filename in on_disk:
+            by_filename[filename] = item
+        else:
+            report['missing'].append({'id': item['id'], 'detail_url': item.get('detail_url', ''), 'file': filename})
+
+    for result in check_images((images_dir / name for name in by_filename), workers=workers, decode=decode):
+        report['checked'] += 1
+        if result['error']:
+            item = by_filename[result['name']]
+            report['corrupt'].append({'id': item['id'], 'detail_url': item.get('detail_url', ''),
+                                      'file': result['name'], 'error': result['error']})
+
+    # Prompt files are named like the image (item_XXXX_timestamp.json)
+    items_by_id = {item['id']: item for item in items}
+    referenced_prompts = set()
+    if prompts_dir.exists():
+        for entry in os.scandir(prompts_dir):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                report['prompt_drift'].append({'id': None, 'detail_url': '', 'file': entry.name,
+                                               'error': f'unreadable: {e}'})
+                continue
+            item = items_by_id.get(data.get('id'))
+            if item is None or item.get('timestamp') != data.get('timestamp'):
+                report['untracked'].append({'file': f"prompts/{entry.name}"})
+                continue
+            referenced_prompts.add(item['id'])
+            for field in ('prompt', 'image_filename', 'detail_url'):
+                if data.get(field, '') != item.get(field, ''):
+                    report['prompt_drift'].append({'id': item['id'], 'detail_url': item.get('detail_url', ''),
+                                                   'file': entry.name, 'error': f'{field} differs from summary'})
+                    break
+
+    for item in items:
+        if item.get('prompt') and item['id'] not in referenced_prompts:
+            report['prompt_drift'].append({'id': item['id'], 'detail_url': item.get('detail_url', ''),
+                                           'file': None, 'error': 'prompt file missing'})
+
+    referenced_images = {item.get('image_filename') for item in items}
+    report['untracked'].extend({'file': f"images/{name}"} for name in sorted(on_disk - referenced_images))
+    return report
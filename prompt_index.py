@@ -0,0 +1,205 @@
+"""
+Prompt Index
+MinHash signatures of prompts and an LSH index over them, used to group
+near-duplicate and iterated prompts into clusters
+"""
+
+import base64
+import hashlib
+import json
+import operator
+import random
+import re
+import zlib
+from array import array
+
+NUM_BINS = 64
+BANDS = 16
+ROWS = NUM_BINS // BANDS
+DEFAULT_THRESHOLD = 0.5  # estimated Jaccard similarity of word-pair sets for two prompts to be related
+SIGNATURE_CACHE_FILE = "prompt_signatures.json"
+
+# A 32-bit hash per word pair: the top bits pick the bin, the rest compete for its minimum
+VALUE_BITS = 32 - (NUM_BINS.bit_length() - 1)
+VALUE_MASK = (1 << VALUE_BITS) - 1
+EMPTY = VALUE_MASK + 1
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize(prompt):
+    return ' '.join(WORD_RE.findall(prompt.lower()))
+
+
+def shingles(prompt):
+    """Word pairs of a prompt (single words for one-word prompts)"""
+    words = WORD_RE.findall(prompt.lower())
+    if len(words) < 2:
+        return set(words)
+    return {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+def _probe_orders():
+    """Fixed pseudo-random bin order per bin, for densifying empty bins"""
+    rng = random.Random(0x5EED)
+    orders = []
+    for slot in range(NUM_BINS):
+        others = [other for other in range(NUM_BINS) if other != slot]
+        rng.shuffle(others)
+        orders.append(others)
+    return orders
+
+
+PROBE_ORDERS = _probe_orders()
+
+
+def signature(prompt):
+    """One-permutation MinHash signature: NUM_BINS per-bin minima, empty bins densified.
+
+    Each word pair is hashed once; its top bits pick a bin and the remaining bits
+    compete for that bin's minimum. An empty bin copies the first non-empty bin of its own
+    random probe order, so the bins of a short prompt stay (nearly) independent and
+    a shared common word pair does not fill whole LSH bands.
+    """
+    bins = [EMPTY] * NUM_BINS
+    for shingle in shingles(prompt):
+        value = zlib.crc32(shingle.encode('utf-8'))
+        slot = value >> VALUE_BITS
+        low = value & VALUE_MASK
+        if low < bins[slot]:
+            bins[slot] = low
+    if all(value == EMPTY for value in bins):
+        return array('I', [VALUE_MASK] * NUM_BINS)
+    filled = list(bins)
+    for slot in range(NUM_BINS):
+        if bins[slot] == EMPTY:
+            for other in PROBE_ORDERS[slot]:
+                if bins[other] != EMPTY:
+                    filled[slot] = bins[other]
+                    break
+    return array('I', filled)
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(map(operator.eq, sig_a, sig_b)) / NUM_BINS
+
+
+def prompt_digest(prompt):
+    return hashlib.sha1(normalize(prompt).encode('utf-8')).hexdigest()[:16]
+
+
+def encode_signature(sig):
+    return base64.b64encode(sig.tobytes()).decode('ascii')
+
+
+def decode_signature(text):
+    sig = array('I')
+    sig.frombytes(base64.b64decode(text))
+    return sig
+
+
+def load_signatures(prompts, cache_file):
+    """Signatures for {key: prompt}, reusing cached ones for prompts seen before.
+
+    The cache maps a digest of the normalized prompt to its signature, so later
+    runs only hash new or edited prompts.
+    """
+    cache = {}
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+
+    signatures = {}
+    fresh_cache = {}
+    for key, prompt in prompts.items():
+        digest = prompt_digest(prompt)
+        encoded = cache.get(digest) or fresh_cache.get(digest)
+        if encoded is None:
+            encoded = encode_signature(signature(prompt))
+        fresh_cache[digest] = encoded
+        signatures[key] = decode_signature(encoded)
+
+    if fresh_cache.keys() != cache.keys():
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump(fresh_cache, f)
+    return signatures
+
+
+class PromptLSH:
+    """Locality-sensitive hashing over MinHash signatures.
+
+    Signatures are cut into BANDS bands of ROWS values; prompts sharing any band
+    land in the same bucket and become candidates, which are then checked against
+    the threshold. Only bucket mates are compared, never all pairs.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.buckets = [{} for _ in range(BANDS)]
+        self.signatures = {}
+
+    def __len__(self):
+        return len(self.signatures)
+
+    @staticmethod
+    def band_keys(sig):
+        raw = sig.tobytes()
+        width = len(raw) // BANDS
+        return [raw[band * width:(band + 1) * width] for band in range(BANDS)]
+
+    def add(self, key, sig):
+        self.signatures[key] = sig
+        for bucket, band_key in zip(self.buckets, self.band_keys(sig)):
+            bucket.setdefault(band_key, []).append(key)
+
+    def query(self, sig, threshold=None):
+        """Return [(key, similarity)] for indexed prompts at or above threshold, most similar first"""
+        threshold = self.threshold if threshold is None else threshold
+        seen = set()
+        matches = []
+        for bucket, band_key in zip(self.buckets, self.band_keys(sig)):
+            for key in bucket.get(band_key, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                score = similarity(self.signatures[key], sig)
+                if score >= threshold:
+                    matches.append((key, score))
+        matches.sort(key=lambda match: -match[1])
+        return matches
+
+    def clusters(self, threshold=None):
+        """Group keys into connected clusters of related prompts (singletons omitted)"""
+        parent = {key: key for key in self.signatures}
+
+        def find(key):
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        threshold = self.threshold if threshold is None else threshold
+        # Candidate pairs are bucket mates; pairs already joined are not compared again
+        for bucket in self.buckets:
+            for members in bucket.values():
+                for i, key in enumerate(members[:-1]):
+                    sig = self.signatures[key]
+                    for other in members[i + 1:]:
+                        root_a, root_b = find(key), find(other)
+                        if root_a != root_b and similarity(sig, self.signatures[other]) >= threshold:
+                            parent[root_b] = root_a
+
+        clusters = {}
+        for key in self.signatures:
+            clusters.setdefault(find(key), []).append(key)
+        return [sorted(members) for members in clusters.values() if len(members) > 1]
+
+
+def build_index(signatures, threshold=DEFAULT_THRESHOLD):
+    """Build a PromptLSH from a {key: signature} mapping"""
+    index = PromptLSH(threshold=threshold)
+    for key, sig in signatures.items():
+        index.add(key, sig)
+    return index
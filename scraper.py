@@ -5,29 +5,136 @@ Downloads images and prompts from https://sora.chatgpt.com/library
 
 import os
 import json
+import re
 import time
 from pathlib import Path
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+
+from extraction import (
+    LINK_SELECTORS, PROMPT_SELECTORS, PROMPT_BUTTON_SELECTORS, PROMPT_STRATEGIES, IMAGE_STRATEGIES,
+    IMAGE_SRC_ATTRIBUTES, NEXT_BUTTON_SCRIPT, SelectorCache,
+    absolute_url, is_prompt_button_text, longest_prompt_line, normalize_detail_url, pick_srcset_url,
+    image_extension,
+)
+
+# Share of a --deadline budget that scrolling the library may use; the rest is for processing items
+DISCOVERY_BUDGET_SHARE = 0.5
+
+
+class MemoryGovernor:
+    """Decides when to recycle the browser page/context to keep memory flat on long runs.
+    
+    Recycles every `recycle_every` items, or earlier when the browser and driver
+    processes use more than `max_rss_mb` (measured with psutil when installed).
+    """
+    
+    def __init__(self, recycle_every=200, max_rss_mb=2048, min_items_between=10):
+        self.recycle_every = recycle_every
+        self.max_rss_mb = max_rss_mb
+        self.min_items_between = min_items_between
+        self.items_since_recycle = 0
+        self.recycle_count = 0
+        try:
+            import psutil
+            self.psutil = psutil
+        except ImportError:
+            self.psutil = None
+            if max_rss_mb:
+                print("⚠ psutil is not installed - recycling by item count only (pip install psutil)")
+    
+    def browser_rss_mb(self):
+        """Total RSS of all child processes (Playwright driver and Chromium) in MB"""
+        if self.psutil is None:
+            return None
+        total = 0
+        for child in self.psutil.Process().children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except (self.psutil.NoSuchProcess, self.psutil.AccessDenied):
+                continue
+        return total / (1024 * 1024)
+    
+    def item_done(self):
+        """Record a processed item; returns the reason to recycle now, or None"""
+        self.items_since_recycle += 1
+        if self.recycle_every and self.items_since_recycle >= self.recycle_every:
+            return f"{self.items_since_recycle} items since last recycle"
+        if self.max_rss_mb and self.items_since_recycle >= self.min_items_between:
+            rss = self.browser_rss_mb()
+            if rss is not None and rss > self.max_rss_mb:
+                return f"browser memory {rss:.0f} MB > {self.max_rss_mb} MB"
+        return None
+    
+    def recycled(self):
+        self.items_since_recycle = 0
+        self.recycle_count += 1
 
 
 class SoraScraper:
-    def __init__(self, output_dir="downloads", use_persistent_context=False, browser_data_dir=None, max_items=None):
+    def __init__(self, output_dir="downloads", use_persistent_context=False, browser_data_dir=None, max_items=None,
+                 mode='all', queue_path=None, visibility_timeout=300, recycle_every=200, max_browser_mb=2048,
+                 save_snapshots=False, order='newest', priority_urls=None, deadline=None, resume=False,
+                 use_selector_cache=True, poll_interval=30, max_poll_interval=600, record_har=None, replay_har=None,
+                 create_dirs=True):
         self.output_dir = Path(output_dir)
-        self.output_dir.mkdir(exist_ok=True)
-        
-        # Create subdirectories
         self.images_dir = self.output_dir / "images"
         self.prompts_dir = self.output_dir / "prompts"
-        self.images_dir.mkdir(exist_ok=True)
-        self.prompts_dir.mkdir(exist_ok=True)
+        
+        # Create subdirectories (the offline commands only read an existing library)
+        if create_dirs:
+            self.output_dir.mkdir(exist_ok=True)
+            self.images_dir.mkdir(exist_ok=True)
+            self.prompts_dir.mkdir(exist_ok=True)
         
         self.items = []
         self.use_persistent_context = use_persistent_context
         self.browser_data_dir = browser_data_dir or (self.output_dir / "browser_data")
         self.max_items = max_items  # Maximum number of items to process (None = all)
         
+        # Scheduling: processing order, user-chosen URLs first, and a time budget in seconds
+        self.order = order
+        # Normalized like discovered links, so a pasted URL with a query or trailing slash still matches
+        self.priority_urls = [normalize_detail_url(url) for url in priority_urls or []]
+        self.time_budget = deadline
+        self.deadline = None  # absolute time, set when the run starts
+        self.discovery_deadline = None  # absolute time by which scrolling stops, if earlier than the deadline
+        self.resume = resume
+        self.checkpoint_file = self.output_dir / "checkpoint.json"
+        
+        # Which selector/extraction path worked, tried first on later pages and runs
+        self.selector_cache = SelectorCache(self.output_dir / "selector_cache.json") if use_selector_cache else None
+        
+        # Compressed DOM snapshots of detail pages, for offline re-parsing
+        self.snapshots_dir = self.output_dir / "snapshots"
+        self.save_snapshots = save_snapshots
+        if save_snapshots:
+            self.snapshots_dir.mkdir(exist_ok=True)
+        
+        # Distributed crawl: 'all' runs locally, 'discover'/'work'/'merge' use the shared queue
+        self.mode = mode
+        self.queue_path = Path(queue_path) if queue_path else (self.output_dir / "queue.sqlite")
+        self.visibility_timeout = visibility_timeout
+        
+        # Watch mode: seconds between polls of the library top, backing off while idle
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        
+        # HAR capture of a live session, or offline replay of one through Playwright routing
+        self.record_har = Path(record_har) if record_har else None
+        self.replay_har = Path(replay_har) if replay_har else None
+        self.har_context = None
+        self.download_page = None
+        
+        # Long-run memory: recycle the page/context periodically (see MemoryGovernor)
+        self.recycle_every = recycle_every
+        self.max_browser_mb = max_browser_mb
+        self.governor = None
+        self.browser = None
+        self.context_options = None
+        
     def wait_for_login_page(self, page, timeout=60):
         """Wait for login page to be visible"""
+        from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+        
         print("Waiting for login page to appear...")
         print(f"Current URL: {page.url}")
         
@@ -175,35 +282,29 @@ class SoraScraper:
         
         # Try multiple selectors to find clickable library items (links to detail pages)
         # Detail pages have pattern "g/gen" in the URL
-        selectors = [
-            'a[href*="/g/gen"]',
-            'a[href*="g/gen"]',
-            'a[href*="/library/"]',
-            'a[href*="/detail"]',
-            'article a',
-            '[data-testid*="library"] a',
-            '[data-testid*="card"] a',
-            '.library-item a',
-            'div[role="article"] a',
-        ]
+        # (the selector that worked last time is tried first)
+        selectors = self.cache_order('links', LINK_SELECTORS)
         
-        elements = None
+        hrefs = None
+        matched_selector = None
         
+        # Read hrefs inside the page so no ElementHandles are created (they would
+        # otherwise pile up in the driver for the lifetime of the page)
         for selector in selectors:
             try:
-                elements = page.query_selector_all(selector)
-                if elements and len(elements) > 0:
+                hrefs = page.eval_on_selector_all(selector, 'els => els.map(e => e.getAttribute("href"))')
+                if hrefs and len(hrefs) > 0:
+                    matched_selector = selector
                     break
             except:
                 continue
         
-        if not elements or len(elements) == 0:
+        if not hrefs or len(hrefs) == 0:
             return detail_links
         
-        # Extract detail page URLs from clickable elements
-        for idx, element in enumerate(elements):
+        # Extract detail page URLs from the matched anchors
+        for href in hrefs:
             try:
-                href = element.get_attribute('href')
                 if href:
                     # Handle relative URLs
                     if href.startswith('/'):
@@ -214,24 +315,31 @@ class SoraScraper:
                     # Include links that match the "g/gen" pattern or other detail page patterns
                     if '/g/gen' in href or 'g/gen' in href or '/library/' in href or '/detail' in href:
                         # Normalize URL (remove trailing slashes, fragments, etc.)
-                        normalized_url = href.split('#')[0].split('?')[0].rstrip('/')
+                        normalized_url = normalize_detail_url(href)
                         detail_links.append({
                             'detail_url': normalized_url,
-                            'original_url': href,
-                            'element': element
+                            'original_url': href
                         })
             except Exception as e:
                 continue
         
+        # Only a selector whose anchors led to detail pages counts as a hit
+        if detail_links:
+            self.cache_record('links', matched_selector)
+        
         return detail_links
     
     def scroll_and_load_more(self, page, collected_links=None):
-        """Scroll down to load more items and collect links during scrolling"""
+        """Scroll down to load more items and collect links during scrolling.
+        
+        Returns a dict of detail URL -> feed position (0 = first/newest in the feed).
+        """
         if collected_links is None:
-            collected_links = set()
+            collected_links = {}
         
-        # Check if we have a limit
-        has_limit = self.max_items is not None and self.max_items > 0
+        # Check if we have a limit. Oldest-first needs the end of the feed, so it scrolls
+        # the whole library and the limit is applied after scheduling.
+        has_limit = self.max_items is not None and self.max_items > 0 and self.order != 'oldest'
         limit_reached = False
         
         if has_limit:
@@ -249,13 +357,17 @@ class SoraScraper:
             # Extract links from current page state before scrolling
             current_links = self.extract_links_from_page(page)
             for link_data in current_links:
-                collected_links.add(link_data['detail_url'])
+                collected_links.setdefault(link_data['detail_url'], len(collected_links))
             
             new_link_count = len(collected_links)
             if new_link_count > last_link_count:
                 print(f"  Found {new_link_count} unique links so far...")
                 last_link_count = new_link_count
             
+            if self.deadline_reached(deadline=self.discovery_deadline):
+                print("  ⏱ Deadline reached. Stopping scroll...")
+                break
+            
             # Check if limit reached before scrolling
             if has_limit and len(collected_links) >= self.max_items:
                 limit_reached = True
@@ -264,12 +376,12 @@ class SoraScraper:
             
             # Scroll down
             page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-            time.sleep(2)  # Wait for content to load
+            self.pause(2, page)  # Wait for content to load
             
             # Extract links again after scrolling (in case new items loaded)
             current_links = self.extract_links_from_page(page)
             for link_data in current_links:
-                collected_links.add(link_data['detail_url'])
+                collected_links.setdefault(link_data['detail_url'], len(collected_links))
             
             new_link_count = len(collected_links)
             if new_link_count > last_link_count:
@@ -286,13 +398,13 @@ class SoraScraper:
             new_height = page.evaluate("document.body.scrollHeight")
             if new_height == last_height:
                 # No new content, but wait a bit more and check again
-                time.sleep(1)
+                self.pause(1, page)
                 final_height = page.evaluate("document.body.scrollHeight")
                 if final_height == new_height:
                     # Try extracting links one more time
                     current_links = self.extract_links_from_page(page)
                     for link_data in current_links:
-                        collected_links.add(link_data['detail_url'])
+                        collected_links.setdefault(link_data['detail_url'], len(collected_links))
                     
                     # Check limit one more time
                     if has_limit and len(collected_links) >= self.max_items:
@@ -316,11 +428,11 @@ class SoraScraper:
                 load_more_button = page.query_selector('button:has-text("Load more"), button:has-text("Show more")')
                 if load_more_button and load_more_button.is_visible():
                     load_more_button.click()
-                    time.sleep(2)
+                    self.pause(2, page)
                     # Extract links after clicking load more
                     current_links = self.extract_links_from_page(page)
                     for link_data in current_links:
-                        collected_links.add(link_data['detail_url'])
+                        collected_links.setdefault(link_data['detail_url'], len(collected_links))
                     
                     # Check limit after clicking load more
                     if has_limit and len(collected_links) >= self.max_items:
@@ -335,7 +447,7 @@ class SoraScraper:
             print("  Final link extraction...")
             final_links = self.extract_links_from_page(page)
             for link_data in final_links:
-                collected_links.add(link_data['detail_url'])
+                collected_links.setdefault(link_data['detail_url'], len(collected_links))
         
         final_count = len(collected_links)
         if has_limit:
@@ -351,7 +463,7 @@ class SoraScraper:
         
         # Wait for content to load
         page.wait_for_load_state("networkidle")
-        time.sleep(3)
+        self.pause(3, page)
         
         # Scroll and collect links during scrolling
         collected_link_urls = self.scroll_and_load_more(page)
@@ -364,19 +476,288 @@ class SoraScraper:
                 f.write(page.content())
             return []
         
-        # Convert collected URLs to link objects
+        # Convert collected URLs to link objects, keeping the feed's newest-first order
         unique_links = []
-        for idx, url in enumerate(sorted(collected_link_urls)):
+        for url, position in sorted(collected_link_urls.items(), key=lambda entry: entry[1]):
             unique_links.append({
-                'id': idx,
+                'id': position,
                 'detail_url': url,
-                'element': None  # We don't need the element anymore
+                'feed_position': position
             })
         
         print(f"\n✓ Collected {len(unique_links)} unique detail page links during scrolling")
         print(f"  Now processing each detail page...\n")
         return unique_links
     
+    def deadline_reached(self, reserve=0, deadline=None):
+        """True if the run's time budget (or an earlier `deadline`) is used up, keeping `reserve` seconds for one more step"""
+        deadline = self.deadline if deadline is None else deadline
+        return deadline is not None and time.time() + reserve >= deadline
+    
+    def add_priority_links(self, item_links):
+        """Append priority entries that are full URLs but were not found while scrolling"""
+        discovered = {link['detail_url'] for link in item_links}
+        next_id = max((link['id'] for link in item_links), default=-1) + 1
+        added = 0
+        for url in self.priority_urls:
+            if '://' in url and url not in discovered:
+                item_links.append({'id': next_id, 'detail_url': url})
+                discovered.add(url)
+                next_id += 1
+                added += 1
+        if added:
+            print(f"  Added {added} priority URLs that were not found in the feed")
+        return item_links
+    
+    def schedule_items(self, item_links):
+        """Order item links for processing: priority URLs first, then by feed position"""
+        def priority(link):
+            # Earlier entries in priority_urls win; an entry may be a full URL or a fragment of one
+            for rank, wanted in enumerate(self.priority_urls):
+                if wanted and wanted in link['detail_url']:
+                    return rank
+            return len(self.priority_urls)
+        
+        position = lambda link: link.get('feed_position', link['id'])
+        if self.order == 'oldest':
+            return sorted(item_links, key=lambda link: (priority(link), -position(link)))
+        return sorted(item_links, key=lambda link: (priority(link), position(link)))
+    
+    def save_checkpoint(self, remaining_links):
+        """Record the items a deadline-stopped run did not get to, for --resume"""
+        with open(self.checkpoint_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'remaining': remaining_links
+            }, f, indent=2, ensure_ascii=False)
+        print(f"  Checkpoint with {len(remaining_links)} remaining items saved to: {self.checkpoint_file}")
+    
+    def load_checkpoint(self):
+        """Return the remaining item links of the last checkpoint, or None"""
+        if not self.checkpoint_file.exists():
+            return None
+        with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get('remaining', [])
+    
+    def merge_with_summary(self, new_items):
+        """Combine new items with the existing summary; new items replace entries for the same detail page.
+        
+        New items come from another run's numbering (a queue, a checkpoint), so a replaced
+        entry keeps its summary id and a new item whose id is taken gets the next free one.
+        """
+        merged = {}
+        summary = self.load_summary()
+        for item in (summary or {}).get('items', []):
+            merged[item.get('detail_url') or ('id', item['id'])] = item
+        used_ids = {item['id'] for item in merged.values()}
+        next_id = max(used_ids, default=-1) + 1
+        for item in new_items:
+            key = item.get('detail_url') or ('id', item['id'])
+            if key in merged:
+                item = {**item, 'id': merged[key]['id']}
+            elif item['id'] in used_ids:
+                item = {**item, 'id': next_id}
+                next_id += 1
+            used_ids.add(item['id'])
+            merged[key] = item
+        return sorted(merged.values(), key=lambda item: item['id'])
+    
+    def cache_order(self, chain, candidates):
+        """Candidates of a fallback chain, last known winner first"""
+        if self.selector_cache is None:
+            return list(candidates)
+        return self.selector_cache.order(chain, candidates)
+    
+    def cache_record(self, chain, candidate):
+        if self.selector_cache is not None:
+            self.selector_cache.record(chain, candidate)
+    
+    def prompt_from_element(self, page, selector):
+        """Prompt from the first element matching selector, extended by a following button's text"""
+        prompt_elem = page.query_selector(selector)
+        if not prompt_elem:
+            return None
+        text = prompt_elem.inner_text().strip()
+        if not text or len(text) <= 10:
+            return None
+        prompt_text = text
+        # Try to find button after this element
+        # Look for next sibling button or button in parent
+        try:
+            button_text = prompt_elem.evaluate(NEXT_BUTTON_SCRIPT)
+            if button_text and len(button_text) > len(text):
+                prompt_text = button_text.strip()
+        except:
+            pass
+        return prompt_text
+    
+    def prompt_from_buttons(self, page, selector):
+        """Prompt from the first button matching selector whose text looks like a prompt"""
+        for button in page.query_selector_all(selector):
+            button_text = button.inner_text().strip()
+            # Look for buttons with longer descriptive text that might be the prompt
+            if is_prompt_button_text(button_text):
+                return button_text
+        return None
+    
+    def prompt_from_page_text(self, page):
+        """Longest paragraph-like line of the whole page text"""
+        body_text = page.evaluate('document.body.innerText || document.body.textContent || ""')
+        return longest_prompt_line(body_text)
+    
+    def run_prompt_strategy(self, page, strategy):
+        """Run one entry of PROMPT_STRATEGIES ("element:<selector>", "button:<selector>" or "page_text")"""
+        stage, _, selector = strategy.partition(':')
+        try:
+            if stage == 'element':
+                return self.prompt_from_element(page, selector)
+            if stage == 'button':
+                return self.prompt_from_buttons(page, selector)
+            return self.prompt_from_page_text(page)
+        except:
+            return None
+    
+    def extract_prompt(self, page):
+        """Find the prompt text on a detail page.
+        
+        The strategy that produced the last complete prompt is tried first; only
+        when it misses does the full chain (elements, buttons, page text) run.
+        """
+        tried = {}
+        cached = self.selector_cache.best('prompt', PROMPT_STRATEGIES) if self.selector_cache else None
+        if cached:
+            prompt_text = tried[cached] = self.run_prompt_strategy(page, cached)
+            if prompt_text and len(prompt_text) >= 20:
+                self.cache_record('prompt', cached)
+                return prompt_text
+        
+        # The chain reuses the cached strategy's result instead of querying the page again
+        def attempt(strategy):
+            if strategy not in tried:
+                tried[strategy] = self.run_prompt_strategy(page, strategy)
+            return tried[strategy]
+        
+        # First find the prompt text element (and a button after it)
+        prompt_text = None
+        strategy = None
+        for selector in PROMPT_SELECTORS:
+            text = attempt(f'element:{selector}')
+            if text:
+                prompt_text, strategy = text, f'element:{selector}'
+                break
+        
+        # Also try to find button directly with prompt-related text
+        if not prompt_text or len(prompt_text) < 20:
+            for selector in PROMPT_BUTTON_SELECTORS:
+                text = attempt(f'button:{selector}')
+                if text:
+                    prompt_text, strategy = text, f'button:{selector}'
+                if prompt_text:
+                    break
+        
+        # If still no prompt, try getting all text on page
+        if not prompt_text or len(prompt_text) < 10:
+            text = attempt('page_text')
+            if text:
+                prompt_text, strategy = text, 'page_text'
+        
+        if prompt_text and len(prompt_text) >= 20:
+            self.cache_record('prompt', strategy)
+        return prompt_text
+    
+    def find_image_by_strategy(self, page, strategy):
+        """Locate the generated image with one entry of IMAGE_STRATEGIES; returns an ElementHandle or None"""
+        if strategy == 'alt_exact':
+            # Look for img with alt="Generated image" (exact match)
+            img_candidates = page.query_selector_all('img[alt="Generated image"]')
+            if img_candidates:
+                print(f"  ✓ Found {len(img_candidates)} image(s) with alt='Generated image'")
+                print(f"  → Using image with alt='Generated image'")
+                # Get the first one (should be the main generated image)
+                return img_candidates[0]
+            return None
+        
+        if strategy == 'alt_contains':
+            img_candidates = []
+            for candidate in page.query_selector_all('img'):
+                try:
+                    alt_text = candidate.get_attribute('alt')
+                    if alt_text and 'Generated image' in alt_text:
+                        img_candidates.append(candidate)
+                except:
+                    pass
+            if img_candidates:
+                print(f"  ✓ Found {len(img_candidates)} image(s) with alt containing 'Generated image'")
+                return img_candidates[0]
+            return None
+        
+        # Find largest WebP image, falling back to the largest image
+        largest_webp = None
+        largest_webp_size = 0
+        largest_img = None
+        largest_size = 0
+        
+        for candidate_img in page.query_selector_all('img'):
+            try:
+                if candidate_img.is_visible():
+                    box = candidate_img.bounding_box()
+                    if box and box['width'] > 0 and box['height'] > 0:
+                        size = box['width'] * box['height']
+                        img_src_check = candidate_img.get_attribute('src') or candidate_img.get_attribute('data-src') or ''
+                        
+                        # Prioritize WebP images
+                        if '.webp' in img_src_check.lower() and size > largest_webp_size:
+                            largest_webp_size = size
+                            largest_webp = candidate_img
+                        elif size > largest_size:
+                            largest_size = size
+                            largest_img = candidate_img
+            except:
+                continue
+        
+        if largest_webp:
+            print(f"  → Using largest WebP image ({largest_webp_size}px)")
+            return largest_webp
+        if largest_img:
+            print(f"  → Using largest image ({largest_size}px)")
+        return largest_img
+    
+    def find_image(self, page):
+        """Locate the main generated image.
+        
+        Not cached: the chain is the one precise lookup followed by catch-alls, so the
+        first entry is always the one worth trying first.
+        """
+        for strategy in IMAGE_STRATEGIES:
+            try:
+                img = self.find_image_by_strategy(page, strategy)
+            except Exception as e:
+                print(f"  ⚠ Error finding image ({strategy}): {e}")
+                continue
+            if img:
+                return img
+        return None
+    
+    def image_source(self, img):
+        """Image URL from the first populated src-like attribute, or the best srcset entry"""
+        for attr in self.cache_order('image_src', IMAGE_SRC_ATTRIBUTES + ['srcset']):
+            try:
+                value = img.get_attribute(attr)
+            except:
+                continue
+            if not value or not value.strip():
+                continue
+            if attr == 'srcset':
+                # Parse srcset and prefer largest WebP if available
+                value, description = pick_srcset_url(value)
+                if not value:
+                    continue
+                if description:
+                    print(f"  → Found {description}")
+            self.cache_record('image_src', attr)
+            return value
+        return None
+    
     def process_item_detail(self, page, context, item_link, idx, total):
         """Navigate to detail page, extract prompt from button, and download image"""
         item_data = {
@@ -386,6 +767,8 @@ class SoraScraper:
             'image_filename': '',
             'timestamp': time.strftime('%Y%m%d_%H%M%S')
         }
+        if 'feed_position' in item_link:
+            item_data['feed_position'] = item_link['feed_position']
         
         try:
             print(f"\n[{idx}/{total}] Processing item {idx}...")
@@ -393,101 +776,15 @@ class SoraScraper:
             
             # Navigate to detail page
             page.goto(item_link['detail_url'], wait_until='domcontentloaded', timeout=30000)
-            time.sleep(2)  # Wait for page to load
+            self.pause(2, page)  # Wait for page to load
             page.wait_for_load_state('networkidle', timeout=15000)
-            time.sleep(1)
+            self.pause(1, page)
             
-            # Try to find prompt - look for button tag after the prompt text
-            # First find the prompt text element
-            prompt_text = None
-            prompt_selectors = [
-                'p[class*="prompt"]',
-                'div[class*="prompt"]',
-                'div[class*="text"]',
-                'p',
-                'span[class*="prompt"]',
-                '[data-testid*="prompt"]',
-            ]
+            if self.save_snapshots:
+                self.save_snapshot(page, item_data)
             
-            for selector in prompt_selectors:
-                try:
-                    prompt_elem = page.query_selector(selector)
-                    if prompt_elem:
-                        text = prompt_elem.inner_text().strip()
-                        if text and len(text) > 10:
-                            prompt_text = text
-                            # Try to find button after this element
-                            # Look for next sibling button or button in parent
-                            try:
-                                # Try to find button after the prompt element
-                                button_text = prompt_elem.evaluate('''
-                                    (element) => {
-                                        let current = element.nextElementSibling;
-                                        while (current) {
-                                            if (current.tagName === 'BUTTON') {
-                                                return current.innerText || current.textContent || '';
-                                            }
-                                            current = current.nextElementSibling;
-                                        }
-                                        // Try parent's next sibling
-                                        if (element.parentElement) {
-                                            current = element.parentElement.nextElementSibling;
-                                            while (current) {
-                                                if (current.tagName === 'BUTTON') {
-                                                    return current.innerText || current.textContent || '';
-                                                }
-                                                current = current.nextElementSibling;
-                                            }
-                                        }
-                                        return null;
-                                    }
-                                ''')
-                                if button_text and len(button_text) > len(text):
-                                    prompt_text = button_text.strip()
-                            except:
-                                pass
-                            break
-                except:
-                    continue
-            
-            # Also try to find button directly with prompt-related text
-            if not prompt_text or len(prompt_text) < 20:
-                button_selectors = [
-                    'button:has-text("prompt")',
-                    'button[aria-label*="prompt" i]',
-                    'button[data-testid*="prompt"]',
-                    'button',
-                ]
-                
-                for selector in button_selectors:
-                    try:
-                        buttons = page.query_selector_all(selector)
-                        for button in buttons:
-                            button_text = button.inner_text().strip()
-                            # Look for buttons with longer text that might be the prompt
-                            if button_text and len(button_text) > 20 and len(button_text) < 2000:
-                                # Check if it looks like a prompt (contains descriptive text)
-                                if not button_text.lower().startswith(('click', 'download', 'save', 'share', 'copy')):
-                                    prompt_text = button_text
-                                    break
-                        if prompt_text:
-                            break
-                    except:
-                        continue
-            
-            # If still no prompt, try getting all text on page
-            if not prompt_text or len(prompt_text) < 10:
-                try:
-                    body_text = page.evaluate('document.body.innerText || document.body.textContent || ""')
-                    # Extract the longest paragraph-like text that might be the prompt
-                    lines = [line.strip() for line in body_text.split('\n') if line.strip()]
-                    for line in sorted(lines, key=len, reverse=True):
-                        if len(line) > 20 and len(line) < 2000:
-                            if not any(skip in line.lower() for skip in ['menu', 'navigation', 'header', 'footer', 'cookie']):
-                                prompt_text = line
-                                break
-                except:
-                    pass
+            # Try to find prompt (cached strategy first, then the full fallback chain)
+            prompt_text = self.extract_prompt(page)
             
             if prompt_text:
                 item_data['prompt'] = prompt_text
@@ -501,155 +798,22 @@ class SoraScraper:
             download_clicked = False
             
             try:
-                # First, try to find the specific img tag with alt="Generated image"
-                img = None
-                
-                # Priority 1: Look for img with alt="Generated image" (exact match)
-                try:
-                    # Try exact match first
-                    img_candidates = page.query_selector_all('img[alt="Generated image"]')
-                    if not img_candidates:
-                        # Try case-insensitive match
-                        all_imgs = page.query_selector_all('img')
-                        for candidate in all_imgs:
-                            try:
-                                alt_text = candidate.get_attribute('alt')
-                                if alt_text and 'Generated image' in alt_text:
-                                    img_candidates.append(candidate)
-                            except:
-                                pass
-                    
-                    if img_candidates:
-                        print(f"  ✓ Found {len(img_candidates)} image(s) with alt='Generated image'")
-                        # Get the first one (should be the main generated image)
-                        img = img_candidates[0]
-                        print(f"  → Using image with alt='Generated image'")
-                except Exception as e:
-                    print(f"  ⚠ Error finding img with alt='Generated image': {e}")
-                    pass
-                
-                # Priority 3: Find largest WebP image
-                if not img:
-                    try:
-                        all_imgs = page.query_selector_all('img')
-                        if all_imgs:
-                            # Find the largest WebP image
-                            largest_webp = None
-                            largest_webp_size = 0
-                            largest_img = None
-                            largest_size = 0
-                            
-                            for candidate_img in all_imgs:
-                                try:
-                                    if candidate_img.is_visible():
-                                        box = candidate_img.bounding_box()
-                                        if box and box['width'] > 0 and box['height'] > 0:
-                                            size = box['width'] * box['height']
-                                            img_src_check = candidate_img.get_attribute('src') or candidate_img.get_attribute('data-src') or ''
-                                            
-                                            # Prioritize WebP images
-                                            if '.webp' in img_src_check.lower() and size > largest_webp_size:
-                                                largest_webp_size = size
-                                                largest_webp = candidate_img
-                                            elif size > largest_size:
-                                                largest_size = size
-                                                largest_img = candidate_img
-                                except:
-                                    continue
-                            
-                            # Prefer largest WebP, fallback to largest image
-                            img = largest_webp if largest_webp else largest_img
-                            if img:
-                                if largest_webp:
-                                    print(f"  → Using largest WebP image ({largest_webp_size}px)")
-                                else:
-                                    print(f"  → Using largest image ({largest_size}px)")
-                    except:
-                        pass
+                img = self.find_image(page)
                 
                 if img:
-                    # Try to get image URL from various attributes
-                    img_src = None
-                    src_attributes = ['src', 'data-src', 'data-url', 'data-original', 'data-lazy-src']
-                    
-                    for attr in src_attributes:
-                        try:
-                            img_src = img.get_attribute(attr)
-                            if img_src and img_src.strip():
-                                break
-                        except:
-                            continue
-                    
-                    # If no src found, try to get from srcset (prefer largest WebP)
-                    if not img_src:
-                        try:
-                            srcset = img.get_attribute('srcset')
-                            if srcset:
-                                # Parse srcset and prefer largest WebP if available
-                                srcset_parts = srcset.split(',')
-                                webp_urls = []
-                                largest_webp_url = None
-                                largest_webp_width = 0
-                                
-                                for part in srcset_parts:
-                                    part = part.strip()
-                                    parts = part.split()
-                                    url_part = parts[0] if len(parts) > 0 else part
-                                    # Try to get width descriptor
-                                    width = 0
-                                    if len(parts) > 1:
-                                        width_str = parts[1]
-                                        if width_str.endswith('w'):
-                                            try:
-                                                width = int(width_str[:-1])
-                                            except:
-                                                pass
-                                    
-                                    # Collect WebP URLs with their sizes
-                                    if '.webp' in url_part.lower():
-                                        if width > largest_webp_width:
-                                            largest_webp_width = width
-                                            largest_webp_url = url_part
-                                        webp_urls.append((url_part, width))
-                                
-                                # Use largest WebP URL, or first WebP, or last URL as fallback
-                                if largest_webp_url:
-                                    img_src = largest_webp_url
-                                    print(f"  → Found largest WebP in srcset ({largest_webp_width}w)")
-                                elif webp_urls:
-                                    # Sort by width and get largest
-                                    webp_urls.sort(key=lambda x: x[1], reverse=True)
-                                    img_src = webp_urls[0][0]
-                                    print(f"  → Found WebP in srcset")
-                                else:
-                                    # Fallback: get last URL from srcset
-                                    if srcset_parts:
-                                        img_src = srcset_parts[-1].strip().split()[0]
-                        except:
-                            pass
+                    # Try to get image URL from various attributes (or the srcset)
+                    img_src = self.image_source(img)
                     
                     if img_src:
                         # Handle relative URLs
-                        if img_src.startswith('//'):
-                            img_src = 'https:' + img_src
-                        elif img_src.startswith('/'):
-                            img_src = 'https://sora.chatgpt.com' + img_src
-                        elif not img_src.startswith('http'):
-                            img_src = 'https://sora.chatgpt.com' + '/' + img_src.lstrip('/')
+                        img_src = absolute_url(img_src)
                         
                         print(f"  ✓ Found image URL: {img_src[:80]}...")
                         
                         filename_base = f"item_{item_data['id']:04d}_{item_data['timestamp']}"
                         
                         # Determine file extension from URL (prefer WebP if detected)
-                        ext = '.jpg'
-                        img_src_lower = img_src.lower()
-                        if '.webp' in img_src_lower:
-                            ext = '.webp'
-                        elif '.png' in img_src_lower:
-                            ext = '.png'
-                        elif '.gif' in img_src_lower:
-                            ext = '.gif'
+                        ext = image_extension(img_src)
                         
                         img_filename = f"{filename_base}{ext}"
                         
@@ -683,11 +847,50 @@ class SoraScraper:
             traceback.print_exc()
             return item_data
     
+    def save_snapshot(self, page, item_data):
+        """Save a gzip-compressed DOM snapshot of the current detail page"""
+        import snapshots
+        
+        try:
+            filename = f"item_{item_data['id']:04d}_{item_data['timestamp']}{snapshots.SNAPSHOT_SUFFIX}"
+            meta = {key: item_data[key] for key in ('id', 'detail_url', 'timestamp')}
+            snapshots.save_snapshot(self.snapshots_dir / filename, page.content(), meta)
+        except Exception as e:
+            print(f"  ⚠ Could not save page snapshot: {e}")
+    
+    def pause(self, seconds, page=None):
+        """Fixed wait for the live site; when replaying a HAR, only wait until the page's network is idle"""
+        if not self.replay_har:
+            time.sleep(seconds)
+        elif page is not None:
+            try:
+                page.wait_for_load_state('networkidle', timeout=seconds * 1000)
+            except:
+                pass
+    
+    def download_image_via_browser(self, url, filepath):
+        """Fetch an image with a page of the browser context, so it is recorded to / replayed from the HAR"""
+        if self.download_page is None or self.download_page.is_closed():
+            self.download_page = self.har_context.new_page()
+        response = self.download_page.goto(url, wait_until='commit', timeout=60000)
+        if response is None or not response.ok:
+            raise RuntimeError(f"HTTP {response.status if response else 'no response'}")
+        with open(filepath, 'wb') as out_file:
+            out_file.write(response.body())
+    
     def download_image(self, url, filename):
         """Download an image from URL (supports WebP and other formats)"""
         if not url:
             return False
         
+        if self.record_har or self.replay_har:
+            try:
+                self.download_image_via_browser(url, self.images_dir / filename)
+                return True
+            except Exception as e:
+                print(f"Error downloading image {url}: {e}")
+                return False
+        
         try:
             import urllib.request
             from urllib.parse import urlparse
@@ -803,228 +1006,991 @@ class SoraScraper:
             }
         """)
     
-    def scrape(self):
-        """Main scraping function"""
-        with sync_playwright() as p:
-            # Browser launch args with enhanced stealth settings
-            # Removed flags that might trigger detection, added stealth-specific ones
-            launch_args = [
-                '--disable-blink-features=AutomationControlled',
-                '--disable-features=IsolateOrigins,site-per-process',
-                '--disable-dev-shm-usage',
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--window-size=1920,1080',
-                '--start-maximized',
-                '--disable-infobars',
-                '--exclude-switches=enable-automation',
-                '--disable-extensions',
-                '--disable-notifications',
-                '--disable-translate',
-                '--mute-audio',
-                '--force-color-profile=srgb',
-            ]
-            
-            context_options = {
-                'viewport': {'width': 1920, 'height': 1080},
-                'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
-                'locale': 'en-US',
-                'timezone_id': 'America/New_York',
-                'permissions': ['geolocation', 'notifications'],
-                # Removed all extra_http_headers to avoid CORS issues with OpenAI CDN
-                # Playwright's browser will automatically send appropriate headers
-            }
-            
-            browser = None  # Initialize for cleanup
+    def launch_browser(self, p):
+        """Launch Chromium with stealth settings; returns (browser, context, page)"""
+        # Browser launch args with enhanced stealth settings
+        # Removed flags that might trigger detection, added stealth-specific ones
+        launch_args = [
+            '--disable-blink-features=AutomationControlled',
+            '--disable-features=IsolateOrigins,site-per-process',
+            '--disable-dev-shm-usage',
+            '--no-sandbox',
+            '--disable-setuid-sandbox',
+            '--window-size=1920,1080',
+            '--start-maximized',
+            '--disable-infobars',
+            '--exclude-switches=enable-automation',
+            '--disable-extensions',
+            '--disable-notifications',
+            '--disable-translate',
+            '--mute-audio',
+            '--force-color-profile=srgb',
+        ]
+        
+        context_options = {
+            'viewport': {'width': 1920, 'height': 1080},
+            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36',
+            'locale': 'en-US',
+            'timezone_id': 'America/New_York',
+            'permissions': ['geolocation', 'notifications'],
+            # Removed all extra_http_headers to avoid CORS issues with OpenAI CDN
+            # Playwright's browser will automatically send appropriate headers
+        }
+        
+        browser = None  # Initialize for cleanup
+        self.context_options = context_options
+        
+        # Only the first context records (a recycled context would overwrite the HAR on close)
+        launch_options = dict(context_options)
+        if self.record_har:
+            print(f"Recording network traffic to: {self.record_har}")
+            launch_options['record_har_path'] = str(self.record_har)
+            # .zip HARs keep response bodies as separate files instead of base64 in the JSON
+            launch_options['record_har_content'] = 'attach' if self.record_har.suffix == '.zip' else 'embed'
+        
+        if self.use_persistent_context:
+            # Use persistent browser context (saves cookies and session)
+            print("Using persistent browser context...")
+            print(f"Browser data will be saved to: {self.browser_data_dir}")
+            context = p.chromium.launch_persistent_context(
+                user_data_dir=str(self.browser_data_dir),
+                headless=False,
+                args=launch_args,
+                **launch_options
+            )
+            page = context.pages[0] if context.pages else context.new_page()
+        else:
+            # Launch browser with stealth settings
+            browser = p.chromium.launch(
+                headless=False,
+                args=launch_args
+            )
             
-            if self.use_persistent_context:
-                # Use persistent browser context (saves cookies and session)
-                print("Using persistent browser context...")
-                print(f"Browser data will be saved to: {self.browser_data_dir}")
-                context = p.chromium.launch_persistent_context(
-                    user_data_dir=str(self.browser_data_dir),
-                    headless=False,
-                    args=launch_args,
-                    **context_options
-                )
-                page = context.pages[0] if context.pages else context.new_page()
+            # Create context with realistic settings
+            context = browser.new_context(**launch_options)
+            page = context.new_page()
+        
+        if self.replay_har:
+            # Everything is answered from the HAR; requests it does not contain fail instead of going online
+            print(f"Replaying network traffic from: {self.replay_har}")
+            context.route_from_har(str(self.replay_har), not_found='abort')
+        
+        self.browser = browser
+        self.har_context = context
+        self.governor = MemoryGovernor(self.recycle_every, self.max_browser_mb)
+        self.prepare_page(page)
+        
+        return browser, context, page
+    
+    def prepare_page(self, page):
+        """Apply stealth scripts and window settings to a new page"""
+        # Add stealth scripts to make browser undetectable
+        self.add_stealth_script(page)
+        
+        # Maximize window and bring to front
+        page.set_viewport_size({'width': 1920, 'height': 1080})
+        page.bring_to_front()
+        self.pause(1)
+    
+    def maybe_recycle(self, page, context):
+        """Ask the memory governor whether to recycle; returns the (page, context) to continue with.
+        
+        A fresh context (carrying over cookies/storage) is used when the browser was launched
+        by us; persistent contexts (and HAR runs) can only swap the page. Either way the login is kept.
+        """
+        reason = self.governor.item_done() if self.governor else None
+        if not reason:
+            return page, context
+        
+        swap_context = self.browser is not None and not (self.record_har or self.replay_har)
+        print(f"\n♻ Recycling browser {'context' if swap_context else 'page'} ({reason})...")
+        try:
+            # HAR recording/routing belongs to the first context, so only the page is swapped
+            if swap_context:
+                storage_state = context.storage_state()
+                new_context = self.browser.new_context(storage_state=storage_state, **self.context_options)
+                new_page = new_context.new_page()
+                self.prepare_page(new_page)
+                context.close()
+                context = new_context
             else:
-                # Launch browser with stealth settings
-                browser = p.chromium.launch(
-                    headless=False,
-                    args=launch_args
-                )
-                
-                # Create context with realistic settings
-                context = browser.new_context(**context_options)
-                page = context.new_page()
+                new_page = context.new_page()
+                self.prepare_page(new_page)
+                page.close()
+            page = new_page
+            self.governor.recycled()
+            rss = self.governor.browser_rss_mb()
+            if rss is not None:
+                print(f"  ✓ Browser memory after recycle: {rss:.0f} MB")
+        except Exception as e:
+            # Keep going with the old page rather than losing the run
+            print(f"  ⚠ Could not recycle browser page: {e}")
+            self.governor.recycled()
+        return page, context
+    
+    def open_library(self, page):
+        """Navigate to the library, handling login if needed. Returns False if login failed."""
+        # Navigate to library with realistic timing
+        print("Navigating to Sora library...")
+        
+        # First visit a neutral page to build browser history
+        print("1. Visiting neutral page first...")
+        page.goto('https://www.google.com', wait_until='networkidle')
+        self.pause(2, page)
+        
+        # Now navigate to library
+        print("2. Navigating to Sora library...")
+        try:
+            # Use load state instead of domcontentloaded for better compatibility
+            page.goto('https://sora.chatgpt.com/library', wait_until='load', timeout=60000)
+            # Wait extra time for JavaScript to render
+            self.pause(5, page)
+            # Wait for network to be idle
+            try:
+                page.wait_for_load_state('networkidle', timeout=15000)
+            except:
+                print("  Network idle timeout, but continuing...")
+        except Exception as e:
+            print(f"  Navigation error: {e}")
+            print("  Continuing anyway...")
+            self.pause(3, page)
+        
+        # Check current URL and page state
+        current_url = page.url
+        print(f"Current URL: {current_url}")
+        
+        # Bring browser to front to make sure it's visible
+        page.bring_to_front()
+        self.pause(1, page)
+        
+        # Add some human-like mouse movement
+        page.mouse.move(100, 100)
+        self.pause(0.5, page)
+        page.mouse.move(200, 200)
+        self.pause(0.5, page)
+        
+        # Check if we need to log in
+        needs_login = False
+        
+        # Check URL for login/auth indicators
+        if any(keyword in current_url.lower() for keyword in ['login', 'auth', 'signin']):
+            needs_login = True
+            print("⚠ Login URL detected")
+        
+        # Check page content for login indicators
+        try:
+            page_content = page.content().lower()
+            if any(keyword in page_content for keyword in ['sign in', 'log in', 'login', 'authenticate']):
+                # But check if we're actually on the library page (might just mention login in footer)
+                if 'library' not in current_url.lower():
+                    needs_login = True
+                    print("⚠ Login page content detected")
+        except:
+            pass
+        
+        # Try to find library-specific elements
+        try:
+            # Wait a bit for page to load
+            time.sleep(2)
+            library_elements = page.query_selector_all('[data-testid*="library"], article, [href*="/library/"]')
+            if not library_elements:
+                needs_login = True
+                print("⚠ Library content not found - might need login")
+        except:
+            needs_login = True
+        
+        # If we need login, handle it
+        if needs_login or 'library' not in current_url.lower():
+            print("\n" + "="*60)
+            print("LOGIN REQUIRED")
+            print("="*60)
+            print("The browser window should now be visible.")
+            print("Current URL:", page.url)
             
-            # Add stealth scripts to make browser undetectable
-            self.add_stealth_script(page)
+            # If on auth.openai.com and page is empty, wait for it to load
+            if 'auth.openai.com' in page.url.lower():
+                print("\n⚠ Detected OpenAI auth page. Waiting for page to load...")
+                print("If the page appears empty:")
+                print("  1. Wait 5-10 seconds for it to load")
+                print("  2. Or press F5 to refresh the page")
+                print("  3. The script will continue waiting...")
+                time.sleep(5)  # Give it time to load
             
-            # Maximize window and bring to front
-            page.set_viewport_size({'width': 1920, 'height': 1080})
-            page.bring_to_front()
-            time.sleep(1)
+            print("\nPlease log in to ChatGPT/Sora in the browser.")
+            print("="*60 + "\n")
+            
+            if not self.wait_for_login(page):
+                print("\n❌ Login not completed. Exiting...")
+                return False
+        
+        # Make sure we're on the library page
+        if 'library' not in page.url.lower():
+            print("\nNavigating to library page...")
+            page.goto('https://sora.chatgpt.com/library', wait_until='domcontentloaded')
+            self.pause(3, page)
+        
+        # Final check - bring browser to front
+        page.bring_to_front()
+        print(f"\n✓ Current URL: {page.url}")
+        print("✓ Ready to scrape library content\n")
+        return True
+    
+    def discover_items(self, page):
+        """Extract item links from the library page, saving debug HTML if none are found"""
+        item_links = self.extract_items(page)
+        
+        if not item_links:
+            print("No items found. The page structure might have changed.")
+            print("Please check the selectors in the code or inspect the page manually.")
             
+            # Save page HTML for debugging
+            html_file = self.output_dir / "page_debug.html"
+            with open(html_file, 'w', encoding='utf-8') as f:
+                f.write(page.content())
+            print(f"Page HTML saved to {html_file} for debugging.")
+        return item_links
+    
+    def load_image_index(self, max_distance=None):
+        """Hash downloaded images (cached, process pool) and build a near-duplicate index"""
+        import image_index
+        
+        hashes = image_index.hash_images(self.images_dir, cache_dir=self.output_dir)
+        return image_index.build_index(hashes, max_distance=max_distance or image_index.DEFAULT_MAX_DISTANCE)
+    
+    def annotate_similar_images(self, processed_items):
+        """Add a 'similar_images' list of item ids to each item with near-duplicate images"""
+        import image_index
+        
+        try:
+            hashes = image_index.hash_images(self.images_dir, cache_dir=self.output_dir)
+        except ImportError:
+            print("⚠ Pillow is not installed - skipping near-duplicate detection (pip install Pillow)")
+            return
+        
+        ids_by_filename = {item['image_filename']: item['id'] for item in processed_items if item.get('image_filename')}
+        # Only images added or changed since the last summary write are queried
+        neighbours = image_index.cached_neighbours(hashes, self.output_dir)
+        for item in processed_items:
+            matches = neighbours.get(item.get('image_filename'), [])
+            item['similar_images'] = [ids_by_filename[name] for name, _ in matches if name in ids_by_filename]
+    
+    def load_prompt_index(self, items, threshold=None):
+        """MinHash/LSH index over the prompts of items, keyed by list position (signatures cached across runs)"""
+        import prompt_index
+        
+        prompts = {position: item['prompt'] for position, item in enumerate(items) if item.get('prompt')}
+        signatures = prompt_index.load_signatures(prompts, self.output_dir / prompt_index.SIGNATURE_CACHE_FILE)
+        return prompt_index.build_index(signatures, threshold=threshold or prompt_index.DEFAULT_THRESHOLD)
+    
+    def annotate_prompt_clusters(self, processed_items):
+        """Set 'prompt_cluster' on each item: the smallest item id among its related prompts (None if unique)"""
+        index = self.load_prompt_index(processed_items)
+        cluster_ids = {}
+        for members in index.clusters():
+            cluster_id = min(processed_items[position]['id'] for position in members)
+            for position in members:
+                cluster_ids[position] = cluster_id
+        for position, item in enumerate(processed_items):
+            item['prompt_cluster'] = cluster_ids.get(position)
+    
+    def related_prompts(self, target, threshold=None, limit=20):
+        """Print items whose prompts are related to target (an item id or a prompt text)"""
+        import prompt_index
+        
+        summary = self.load_summary()
+        if summary is None:
+            print(f"❌ No summary.json in {self.output_dir}")
+            return []
+        items = summary.get('items', [])
+        items_by_id = {item['id']: item for item in items}
+        
+        target_id = int(target) if target.strip().isdigit() else None
+        if target_id is not None:
+            if not items_by_id.get(target_id, {}).get('prompt'):
+                print(f"❌ No item with id {target_id} and a prompt")
+                return []
+            query = items_by_id[target_id]['prompt']
+        else:
+            query = target
+        
+        index = self.load_prompt_index(items, threshold)
+        matches = [(items[position]['id'], items[position]['prompt'], score)
+                   for position, score in index.query(prompt_index.signature(query))
+                   if items[position]['id'] != target_id]
+        
+        print(f"Prompts related to {'item ' + str(target_id) if target_id is not None else repr(query[:60])} "
+              f"(similarity ≥ {index.threshold:g}):")
+        for item_id, prompt, score in matches[:limit]:
+            prompt = prompt.replace('\n', ' ')
+            print(f"  {score:.2f}  #{item_id:<6} {prompt[:100]}")
+        if not matches:
+            print("  (none)")
+        elif len(matches) > limit:
+            print(f"  ... and {len(matches) - limit} more")
+        return matches
+    
+    def find_similar(self, target, max_distance=None):
+        """Print downloaded images that are near-duplicates of target (a file path or a filename in images/)"""
+        import image_index
+        
+        target_path = Path(target)
+        if not target_path.exists():
+            target_path = self.images_dir / target
+        if not target_path.exists():
+            print(f"❌ Image not found: {target}")
+            return []
+        
+        index = self.load_image_index(max_distance)
+        matches = [(name, distance) for name, distance in index.query(image_index.dhash(target_path))
+                   if name != target_path.name or target_path.parent.resolve() != self.images_dir.resolve()]
+        
+        print(f"Images similar to {target_path.name} (max distance {index.max_distance}):")
+        for name, distance in matches:
+            print(f"  {distance:2d}  {name}")
+        if not matches:
+            print("  (none)")
+        return matches
+    
+    def print_similar_groups(self, max_distance=None):
+        """Print all groups of near-duplicate images in the library"""
+        index = self.load_image_index(max_distance)
+        groups = index.groups()
+        print(f"Found {len(groups)} groups of near-duplicate images among {len(index)} images:")
+        for number, members in enumerate(sorted(groups, key=len, reverse=True), 1):
+            print(f"\nGroup {number} ({len(members)} images):")
+            for name in members:
+                print(f"  {name}")
+        return groups
+    
+    def export_static(self, export_dir):
+        """Write a deploy-ready copy of the library with hashed, precompressed assets"""
+        import export
+        
+        if not (self.output_dir / "summary.json").exists():
+            print(f"❌ No summary.json in {self.output_dir} - run the scraper first")
+            return None
+        
+        print(f"Exporting static site from {self.output_dir} to {export_dir}...")
+        result = export.export_static(self.output_dir, export_dir)
+        
+        print(f"✓ Exported {result['images']} images ({result['new_images']} new)")
+        print(f"  Summary: {result['summary']} (encodings: {', '.join(e or 'identity' for e in result['encodings'])})")
+        if 'br' not in ''.join(result['encodings']):
+            print("  ⚠ brotli is not installed - only gzip copies were written (pip install brotli)")
+        if result['missing']:
+            print(f"  ⚠ {len(result['missing'])} images referenced in summary.json are missing")
+        return result
+    
+    def load_summary(self):
+        """Load summary.json, or return None if it does not exist"""
+        summary_file = self.output_dir / "summary.json"
+        if not summary_file.exists():
+            return None
+        with open(summary_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def reindex(self):
+        """Rebuild summary.json from the files in prompts/ and images/ (no browser needed)"""
+        if not self.output_dir.exists():
+            print(f"❌ No library in {self.output_dir}")
+            return None
+        
+        print(f"Rebuilding summary from {self.output_dir}...")
+        # Keyed by detail page: ids are feed positions, so different runs reuse them
+        items = {}
+        key = lambda item: item.get('detail_url') or ('id', item['id'], item.get('timestamp'))
+        
+        # Start from the existing summary so items without prompt files keep their data
+        summary = self.load_summary()
+        if summary:
+            for item in summary.get('items', []):
+                items[key(item)] = item
+        known_images = {item.get('image_filename') for item in items.values()}
+        
+        prompt_files = 0
+        prompt_entries = os.scandir(self.prompts_dir) if self.prompts_dir.exists() else []
+        for entry in sorted(prompt_entries, key=lambda e: e.name):
+            if not entry.name.endswith('.json'):
+                continue
             try:
-                # Navigate to library with realistic timing
-                print("Navigating to Sora library...")
-                
-                # First visit a neutral page to build browser history
-                print("1. Visiting neutral page first...")
-                page.goto('https://www.google.com', wait_until='networkidle')
-                time.sleep(2)
-                
-                # Now navigate to library
-                print("2. Navigating to Sora library...")
-                try:
-                    # Use load state instead of domcontentloaded for better compatibility
-                    page.goto('https://sora.chatgpt.com/library', wait_until='load', timeout=60000)
-                    # Wait extra time for JavaScript to render
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"  ⚠ Skipping unreadable prompt file {entry.name}: {e}")
+                continue
+            prompt_files += 1
+            # Images of older downloads of the same page are known, not orphans
+            known_images.add(data.get('image_filename'))
+            existing = items.get(key(data))
+            # The newest download of a detail page wins; an item already in the summary keeps its id
+            if existing is None:
+                items[key(data)] = data
+            elif data.get('timestamp', '') >= existing.get('timestamp', ''):
+                items[key(data)] = {**existing, **data, 'id': existing['id']}
+        
+        # Pick up downloaded images that no summary entry or prompt file refers to
+        by_id_and_time = {(item['id'], item.get('timestamp')): item for item in items.values()}
+        orphans = 0
+        image_entries = os.scandir(self.images_dir) if self.images_dir.exists() else []
+        for entry in sorted(image_entries, key=lambda e: e.name):
+            if entry.name in known_images:
+                continue
+            match = re.match(r'item_(\d+)_(\d{8}_\d{6})', entry.name)
+            if not match:
+                continue
+            item_id, timestamp = int(match.group(1)), match.group(2)
+            item = by_id_and_time.get((item_id, timestamp))
+            if item is None:
+                item = {
+                    'id': item_id,
+                    'detail_url': '',
+                    'prompt': '',
+                    'image_filename': entry.name,
+                    'timestamp': timestamp
+                }
+                items[key(item)] = by_id_and_time[(item_id, timestamp)] = item
+            elif not item.get('image_filename'):
+                item['image_filename'] = entry.name
+            else:
+                orphans += 1
+        
+        # Several runs may have used the same id; the newest item keeps it, the others get free ids
+        ordered = sorted(items.values(), key=lambda item: (item['id'], item.get('timestamp', '')), reverse=True)
+        used_ids = set()
+        next_id = max((item['id'] for item in ordered), default=-1) + 1
+        renumbered = 0
+        for item in ordered:
+            if item['id'] in used_ids:
+                item['id'] = next_id
+                next_id += 1
+                renumbered += 1
+            used_ids.add(item['id'])
+        
+        print(f"  Read {prompt_files} prompt files")
+        if orphans:
+            print(f"  ⚠ {orphans} images belong to items that already have another image (older downloads?)")
+        if renumbered:
+            print(f"  ℹ {renumbered} items shared an id with a newer item and were given new ids")
+        return self.save_summary(sorted(items.values(), key=lambda item: item['id']), title="Reindex complete!")
+    
+    def print_stats(self):
+        """Print library statistics from summary.json and the files on disk"""
+        summary = self.load_summary()
+        if summary is None:
+            print(f"❌ No summary.json in {self.output_dir}")
+            return None
+        
+        items = summary.get('items', [])
+        image_sizes = {}
+        if self.images_dir.exists():
+            image_sizes = {entry.name: entry.stat().st_size for entry in os.scandir(self.images_dir) if entry.is_file()}
+        prompt_files = 0
+        if self.prompts_dir.exists():
+            prompt_files = sum(1 for entry in os.scandir(self.prompts_dir) if entry.name.endswith('.json'))
+        prompt_lengths = [len(item['prompt']) for item in items if item.get('prompt')]
+        referenced = [item['image_filename'] for item in items if item.get('image_filename')]
+        missing = [name for name in referenced if name not in image_sizes]
+        
+        stats = {
+            'scrape_date': summary.get('scrape_date'),
+            'items': len(items),
+            'with_prompts': len(prompt_lengths),
+            'with_images': len(referenced),
+            'missing_images': len(missing),
+            'images_on_disk': len(image_sizes),
+            'images_bytes': sum(image_sizes.values()),
+            'prompt_files': prompt_files,
+            'with_similar': sum(1 for item in items if item.get('similar_images')),
+            'prompt_clusters': len({item['prompt_cluster'] for item in items if item.get('prompt_cluster') is not None}),
+        }
+        
+        print(f"Library: {self.output_dir}")
+        print(f"  Last scrape: {stats['scrape_date']}")
+        print(f"  Items: {stats['items']}")
+        print(f"  Items with prompts: {stats['with_prompts']}")
+        print(f"  Items with images: {stats['with_images']}")
+        print(f"  Items with near-duplicates: {stats['with_similar']}")
+        print(f"  Groups of related prompts: {stats['prompt_clusters']}")
+        print(f"  Images on disk: {stats['images_on_disk']} ({stats['images_bytes'] / (1024 * 1024):.1f} MB)")
+        print(f"  Prompt files: {stats['prompt_files']}")
+        if prompt_lengths:
+            print(f"  Prompt length: avg {sum(prompt_lengths) / len(prompt_lengths):.0f}, max {max(prompt_lengths)} chars")
+        if missing:
+            print(f"  ⚠ Missing images: {len(missing)}")
+        return stats
+    
+    def verify_library(self, workers=None, decode=False, requeue=False):
+        """Hash and header-check all images in parallel and cross-check them with the summary and prompt files"""
+        import integrity
+        
+        if not (self.output_dir / "summary.json").exists():
+            print(f"❌ No summary.json in {self.output_dir}")
+            return None
+        
+        print(f"Verifying library in {self.output_dir}...")
+        start = time.time()
+        try:
+            report = integrity.verify_library(self.output_dir, workers=workers, decode=decode)
+        except ImportError:
+            print("❌ --decode needs Pillow (pip install Pillow)")
+            return None
+        print(f"  Checked {report['checked']} images in {time.time() - start:.1f}s")
+        
+        for problem in report['missing']:
+            print(f"  ❌ Item {problem['id']}: {problem['file']} is missing")
+        for problem in report['corrupt']:
+            print(f"  ❌ Item {problem['id']}: {problem['file']} is corrupt ({problem['error']})")
+        for problem in report['prompt_drift']:
+            print(f"  ⚠ Item {problem['id']}: {problem['file'] or 'prompt file'} - {problem['error']}")
+        if report['untracked']:
+            print(f"  ℹ {len(report['untracked'])} files are not referenced from summary.json")
+        
+        broken = report['missing'] + report['corrupt']
+        if not broken and not report['prompt_drift']:
+            print("✓ All referenced images are present and intact")
+        else:
+            print(f"⚠ {len(report['missing'])} missing, {len(report['corrupt'])} corrupt, "
+                  f"{len(report['prompt_drift'])} prompt mismatches")
+        
+        if requeue:
+            self.requeue_items(broken + [p for p in report['prompt_drift'] if p['id'] is not None])
+        return report
+    
+    def requeue_items(self, problems):
+        """Put items back on the work queue so `scrape --mode work` re-downloads just those"""
+        from work_queue import WorkQueue
+        
+        items = {p['detail_url']: {'id': p['id'], 'detail_url': p['detail_url']} for p in problems if p.get('detail_url')}
+        skipped = len({p['id'] for p in problems}) - len(items)
+        if not items:
+            print("  Nothing to re-queue")
+            return 0
+        
+        queue = WorkQueue(self.queue_path)
+        try:
+            requeued = queue.requeue(items.values())
+        finally:
+            queue.close()
+        print(f"  ✓ Re-queued {requeued} items in {self.queue_path}")
+        if skipped > 0:
+            print(f"  ⚠ {skipped} items have no detail URL and cannot be re-queued")
+        print("  Run `python scraper.py scrape --mode work` and then `--mode merge` to repair them")
+        return requeued
+    
+    def export_archive(self, destination, fmt=None, since=None, until=None, query=None, ids=None, incremental=False):
+        """Stream (a filtered subset of) the library into a zip/tar archive file, or stdout with '-'"""
+        import sys
+        import export
+        
+        to_stdout = destination == '-'
+        # Progress goes to stderr when the archive itself is written to stdout
+        log = sys.stderr if to_stdout else sys.stdout
+        fmt = fmt or ('tar' if to_stdout else export.archive_format_for(destination))
+        if fmt not in export.ARCHIVE_FORMATS:
+            print(f"❌ Unknown archive format for {destination} (use --format {'/'.join(export.ARCHIVE_FORMATS)})", file=log)
+            return None
+        
+        if fmt == 'tar.zst':
+            try:
+                import zstandard
+            except ImportError:
+                print("❌ tar.zst archives need the zstandard package (pip install zstandard)", file=log)
+                return None
+        
+        summary = self.load_summary()
+        if summary is None:
+            print(f"❌ No summary.json in {self.output_dir}", file=log)
+            return None
+        
+        state_file = self.output_dir / export.LAST_ARCHIVE_FILE
+        after = None
+        if incremental and state_file.exists():
+            with open(state_file, 'r', encoding='utf-8') as f:
+                after = json.load(f).get('newest_item')
+            print(f"Incremental archive: items added after {after}", file=log)
+        
+        all_items = summary.get('items', [])
+        items = export.select_items(all_items, since=since, until=until, query=query,
+                                    ids=export.parse_item_ids(ids) if ids else None, after=after)
+        print(f"Archiving {len(items)} of {len(all_items)} items as {fmt} to {'stdout' if to_stdout else destination}...", file=log)
+        
+        try:
+            if to_stdout:
+                counts = export.export_archive(self.output_dir, sys.stdout.buffer, fmt, items, summary.get('scrape_date'))
+                sys.stdout.buffer.flush()
+            else:
+                with open(destination, 'wb') as f:
+                    counts = export.export_archive(self.output_dir, f, fmt, items, summary.get('scrape_date'))
+        except RuntimeError as e:
+            print(f"❌ {e}", file=log)
+            return None
+        
+        print(f"✓ Archived {counts['images']} images ({counts['bytes'] / (1024 * 1024):.1f} MB) "
+              f"and {counts['prompts']} prompt files", file=log)
+        if counts['missing']:
+            print(f"  ⚠ {counts['missing']} images referenced in summary.json are missing", file=log)
+        
+        # Remember the newest archived item so the next --incremental archive starts after it
+        # (filtered archives are partial, so they do not count)
+        newest = max((export.item_time(item) for item in items), default=None)
+        unfiltered = not (since or until or query or ids)
+        if unfiltered and newest and (after is None or newest > after):
+            with open(state_file, 'w', encoding='utf-8') as f:
+                json.dump({'newest_item': newest, 'archived_at': time.strftime('%Y-%m-%d %H:%M:%S')}, f, indent=2)
+        return counts
+    
+    def reparse_snapshots(self, workers=None, write=False):
+        """Re-run prompt and image-URL extraction over saved snapshots, without a browser"""
+        import snapshots
+        
+        summary = self.load_summary()
+        if summary is None:
+            print(f"❌ No summary.json in {self.output_dir}")
+            return None
+        
+        print(f"Re-parsing snapshots in {self.snapshots_dir}...")
+        start = time.time()
+        results = snapshots.reparse_snapshots(self.snapshots_dir, workers=workers)
+        print(f"  Parsed {len(results)} snapshots in {time.time() - start:.1f}s")
+        
+        # Latest snapshot per detail page wins (timestamps sort chronologically). Ids are
+        # feed positions and shift between runs, so they are only used without a URL.
+        latest = {}
+        for result in results:
+            if result.get('error'):
+                print(f"  ⚠ {result['snapshot']}: {result['error']}")
+                continue
+            if not result.get('detail_url') and result.get('id') is None:
+                continue
+            key = result.get('detail_url') or ('id', result['id'])
+            if key not in latest or result.get('timestamp', '') > latest[key].get('timestamp', ''):
+                latest[key] = result
+        
+        if write:
+            self.images_dir.mkdir(exist_ok=True)
+            self.prompts_dir.mkdir(exist_ok=True)
+        
+        changed_prompts = 0
+        new_prompts = 0
+        new_images = 0
+        for item in summary.get('items', []):
+            result = latest.get(item.get('detail_url') or ('id', item['id']))
+            if result is None:
+                continue
+            changed = False
+            if result['prompt'] and result['prompt'] != item.get('prompt'):
+                if item.get('prompt'):
+                    changed_prompts += 1
+                else:
+                    new_prompts += 1
+                if write:
+                    item['prompt'] = result['prompt']
+                    changed = True
+            if result['image_url'] and not item.get('image_filename'):
+                new_images += 1
+                if write:
+                    item['image_url'] = result['image_url']
+                    img_filename = f"item_{item['id']:04d}_{item['timestamp']}{image_extension(result['image_url'])}"
+                    if self.download_image(result['image_url'], img_filename):
+                        item['image_filename'] = img_filename
+                    changed = True
+            # Written once both fields are updated, so the prompt file matches the summary
+            if changed:
+                self.save_prompt(item, f"item_{item['id']:04d}_{item['timestamp']}.json")
+        
+        print(f"  Prompts found for items without one: {new_prompts}")
+        print(f"  Prompts that differ from summary: {changed_prompts}")
+        print(f"  Image URLs found for items without an image: {new_images}")
+        if write:
+            self.save_summary(summary['items'], title="Reparse complete!")
+        elif new_prompts or changed_prompts or new_images:
+            print("  Run again with --write to update summary.json and prompt files")
+        return latest
+    
+    def save_summary(self, processed_items, title="Scraping complete!"):
+        """Write summary.json and print the run statistics"""
+        self.annotate_similar_images(processed_items)
+        self.annotate_prompt_clusters(processed_items)
+        
+        summary = {
+            'total_items': len(processed_items),
+            'scrape_date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'items': processed_items
+        }
+        
+        summary_file = self.output_dir / "summary.json"
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        
+        # Compact columnar copy for tools that should not parse the whole JSON
+        import summary_columns
+        columns_file = summary_columns.write_summary_columns(self.output_dir, processed_items)
+        
+        print("\n" + "="*60)
+        print(f"✓ {title}")
+        print("="*60)
+        print(f"  Total items processed: {len(processed_items)}")
+        print(f"  Items with prompts: {sum(1 for item in processed_items if item.get('prompt'))}")
+        print(f"  Items with images: {sum(1 for item in processed_items if item.get('image_filename'))}")
+        print(f"  Items with near-duplicates: {sum(1 for item in processed_items if item.get('similar_images'))}")
+        print(f"  Items with related prompts: {sum(1 for item in processed_items if item.get('prompt_cluster') is not None)}")
+        print(f"  Images saved to: {self.images_dir}")
+        print(f"  Prompts saved to: {self.prompts_dir}")
+        print(f"  Summary saved to: {summary_file}")
+        print(f"  Columnar summary saved to: {columns_file}")
+        return summary_file
+    
+    def run_local(self, page, context):
+        """Discover and process all items in this process"""
+        resumed = False
+        if self.resume:
+            item_links = self.load_checkpoint()
+            if item_links is None:
+                print("No checkpoint found - running discovery instead")
+            else:
+                resumed = True
+                print(f"Resuming from checkpoint: {len(item_links)} items remaining")
+        
+        if not resumed:
+            if self.deadline is not None:
+                # Leave most of the budget for processing the items scrolling finds
+                self.discovery_deadline = time.time() + (self.deadline - time.time()) * DISCOVERY_BUDGET_SHARE
+            # Extract item links from library page
+            item_links = self.discover_items(page) or []
+            # Full priority URLs are processed even if scrolling stopped before reaching them
+            item_links = self.add_priority_links(item_links)
+        if not item_links:
+            return
+        
+        item_links = self.schedule_items(item_links)
+        
+        # Limit items if max_items is set
+        total_items = len(item_links)
+        if self.max_items is not None and self.max_items > 0:
+            item_links = item_links[:self.max_items]
+            print(f"\nFound {total_items} items. Processing first {len(item_links)} items (limit: {self.max_items})...")
+        else:
+            print(f"\nFound {total_items} items. Processing all items...")
+        print("="*60)
+        
+        processed_items = []
+        remaining_links = []
+        item_durations = []
+        
+        # Process each item: go to detail page, extract prompt, download image
+        for idx, item_link in enumerate(item_links, 1):
+            # Stop before an item that would likely not finish within the deadline
+            average = sum(item_durations) / len(item_durations) if item_durations else 0
+            if self.deadline_reached(reserve=average):
+                remaining_links = item_links[idx - 1:]
+                print(f"\n⏱ Deadline reached after {len(processed_items)} items. Stopping cleanly...")
+                break
+            
+            started = time.time()
+            item_data = self.process_item_detail(page, context, item_link, idx, len(item_links))
+            processed_items.append(item_data)
+            page, context = self.maybe_recycle(page, context)
+            
+            # Small delay between items
+            if idx < len(item_links):
+                self.pause(1)
+            item_durations.append(time.time() - started)
+        
+        if remaining_links:
+            self.save_checkpoint(remaining_links)
+        elif self.checkpoint_file.exists():
+            # Any older checkpoint is stale once a run finishes; --resume must not replay it
+            self.checkpoint_file.unlink()
+        
+        if resumed:
+            processed_items = self.merge_with_summary(processed_items)
+        self.save_summary(processed_items)
+    
+    def run_discover(self, page):
+        """Publish discovered detail URLs to the shared work queue"""
+        from work_queue import WorkQueue
+        
+        item_links = self.discover_items(page)
+        if not item_links:
+            return
+        
+        queue = WorkQueue(self.queue_path)
+        try:
+            added = queue.publish(link['detail_url'] for link in item_links)
+            print(f"\n✓ Published {len(item_links)} items to {self.queue_path} ({added} new)")
+            print(f"  Queue status: {queue.stats()}")
+        finally:
+            queue.close()
+    
+    def run_worker(self, page, context):
+        """Lease items from the shared work queue and process them until it is drained"""
+        from work_queue import WorkQueue
+        
+        queue = WorkQueue(self.queue_path, visibility_timeout=self.visibility_timeout)
+        worker_id = WorkQueue.default_worker_id()
+        processed = 0
+        print(f"Worker {worker_id} processing items from {self.queue_path}")
+        print("="*60)
+        
+        try:
+            while self.max_items is None or self.max_items <= 0 or processed < self.max_items:
+                if self.deadline_reached():
+                    print("\n⏱ Deadline reached. Leaving the remaining items to other workers...")
+                    break
+                item_link = queue.lease(worker_id)
+                if item_link is None:
+                    # Leased items may still come back if another worker dies
+                    if queue.outstanding() == 0:
+                        break
                     time.sleep(5)
-                    # Wait for network to be idle
-                    try:
-                        page.wait_for_load_state('networkidle', timeout=15000)
-                    except:
-                        print("  Network idle timeout, but continuing...")
-                except Exception as e:
-                    print(f"  Navigation error: {e}")
-                    print("  Continuing anyway...")
-                    time.sleep(3)
+                    continue
                 
-                # Check current URL and page state
-                current_url = page.url
-                print(f"Current URL: {current_url}")
+                processed += 1
+                item_data = self.process_item_detail(page, context, item_link, processed, queue.outstanding())
+                if item_data.get('image_filename') or item_data.get('prompt'):
+                    if not queue.complete(item_link['id'], worker_id, item_data):
+                        print(f"  ⚠ Lease for item {item_link['id']} expired before completion")
+                else:
+                    queue.fail(item_link['id'], worker_id, 'no prompt or image extracted', item_data)
+                page, context = self.maybe_recycle(page, context)
                 
-                # Bring browser to front to make sure it's visible
-                page.bring_to_front()
                 time.sleep(1)
-                
-                # Add some human-like mouse movement
-                page.mouse.move(100, 100)
-                time.sleep(0.5)
-                page.mouse.move(200, 200)
-                time.sleep(0.5)
-                
-                # Check if we need to log in
-                needs_login = False
-                
-                # Check URL for login/auth indicators
-                if any(keyword in current_url.lower() for keyword in ['login', 'auth', 'signin']):
-                    needs_login = True
-                    print("⚠ Login URL detected")
-                
-                # Check page content for login indicators
+            
+            print("\n" + "="*60)
+            print(f"✓ Worker finished: {processed} items processed")
+            print(f"  Queue status: {queue.stats()}")
+        finally:
+            queue.close()
+    
+    def poll_library_top(self, page, known_urls, max_scrolls=10):
+        """Reload the library and return detail URLs above the first known item (newest first).
+        
+        Only scrolls further while every visible item is new, so an idle poll costs one reload.
+        """
+        if 'library' in page.url.lower():
+            page.reload(wait_until='domcontentloaded', timeout=60000)
+        else:
+            page.goto('https://sora.chatgpt.com/library', wait_until='domcontentloaded', timeout=60000)
+        try:
+            page.wait_for_load_state('networkidle', timeout=15000)
+        except:
+            pass
+        
+        new_urls = {}
+        for scroll in range(max_scrolls + 1):
+            reached_known = False
+            for link_data in self.extract_links_from_page(page):
+                url = link_data['detail_url']
+                if url in known_urls:
+                    reached_known = True
+                else:
+                    new_urls.setdefault(url, len(new_urls))
+            if reached_known or not known_urls or scroll == max_scrolls:
+                break
+            page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+            time.sleep(2)
+        return sorted(new_urls, key=new_urls.get)
+    
+    def run_watch(self, page, context):
+        """Keep the browser logged in and mirror new library items as they appear"""
+        summary = self.load_summary() or {}
+        known_urls = {item['detail_url'] for item in summary.get('items', []) if item.get('detail_url')}
+        next_id = max((item['id'] for item in summary.get('items', [])), default=-1) + 1
+        interval = self.poll_interval
+        processed = 0
+        
+        print(f"Watching the library for new items ({len(known_urls)} already known)")
+        print(f"  Polling every {self.poll_interval:g}s, backing off to {self.max_poll_interval:g}s while idle")
+        print("  Press Ctrl+C to stop")
+        print("="*60)
+        
+        try:
+            while not self.deadline_reached():
                 try:
-                    page_content = page.content().lower()
-                    if any(keyword in page_content for keyword in ['sign in', 'log in', 'login', 'authenticate']):
-                        # But check if we're actually on the library page (might just mention login in footer)
-                        if 'library' not in current_url.lower():
-                            needs_login = True
-                            print("⚠ Login page content detected")
-                except:
-                    pass
+                    new_urls = self.poll_library_top(page, known_urls)
+                except Exception as e:
+                    print(f"  ⚠ Poll failed: {e}")
+                    new_urls = None
                 
-                # Try to find library-specific elements
-                try:
-                    # Wait a bit for page to load
-                    time.sleep(2)
-                    library_elements = page.query_selector_all('[data-testid*="library"], article, [href*="/library/"]')
-                    if not library_elements:
-                        needs_login = True
-                        print("⚠ Library content not found - might need login")
-                except:
-                    needs_login = True
+                # Session expired or the page got lost: go through the normal login flow again
+                if new_urls is None or 'library' not in page.url.lower():
+                    if not self.open_library(page):
+                        break
+                    continue
                 
-                # If we need login, handle it
-                if needs_login or 'library' not in current_url.lower():
-                    print("\n" + "="*60)
-                    print("LOGIN REQUIRED")
-                    print("="*60)
-                    print("The browser window should now be visible.")
-                    print("Current URL:", page.url)
-                    
-                    # If on auth.openai.com and page is empty, wait for it to load
-                    if 'auth.openai.com' in page.url.lower():
-                        print("\n⚠ Detected OpenAI auth page. Waiting for page to load...")
-                        print("If the page appears empty:")
-                        print("  1. Wait 5-10 seconds for it to load")
-                        print("  2. Or press F5 to refresh the page")
-                        print("  3. The script will continue waiting...")
-                        time.sleep(5)  # Give it time to load
+                if not new_urls:
+                    interval = min(interval * 2, self.max_poll_interval)
+                else:
+                    interval = self.poll_interval
+                    print(f"\n[{time.strftime('%H:%M:%S')}] {len(new_urls)} new item(s)")
                     
-                    print("\nPlease log in to ChatGPT/Sora in the browser.")
-                    print("="*60 + "\n")
+                    # Oldest new item first, so ids grow in creation order
+                    new_items = []
+                    for idx, url in enumerate(reversed(new_urls), 1):
+                        item_link = {'id': next_id, 'detail_url': url}
+                        next_id += 1
+                        new_items.append(self.process_item_detail(page, context, item_link, idx, len(new_urls)))
+                        known_urls.add(url)
+                        page, context = self.maybe_recycle(page, context)
+                    processed += len(new_items)
                     
-                    if not self.wait_for_login(page):
-                        print("\n❌ Login not completed. Exiting...")
-                        return
+                    self.save_summary(self.merge_with_summary(new_items), title="Library updated")
+                    if self.selector_cache is not None:
+                        self.selector_cache.save()
                 
-                # Make sure we're on the library page
-                if 'library' not in page.url.lower():
-                    print("\nNavigating to library page...")
-                    page.goto('https://sora.chatgpt.com/library', wait_until='domcontentloaded')
-                    time.sleep(3)
-                
-                # Final check - bring browser to front
-                page.bring_to_front()
-                print(f"\n✓ Current URL: {page.url}")
-                print("✓ Ready to scrape library content\n")
-                
-                # Extract item links from library page
-                item_links = self.extract_items(page)
+                if self.deadline is not None:
+                    interval = min(interval, max(0, self.deadline - time.time()))
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("\nStopping watch...")
+        
+        print(f"\n✓ Watch finished: {processed} new items mirrored")
+    
+    def merge_queue(self):
+        """Assemble summary.json from all results reported to the shared work queue"""
+        from work_queue import WorkQueue
+        
+        queue = WorkQueue(self.queue_path)
+        try:
+            stats = queue.stats()
+            results = list(queue.results())
+        finally:
+            queue.close()
+        
+        if stats.get('pending') or stats.get('leased'):
+            print(f"⚠ Queue still has outstanding items: {stats}")
+        
+        # Results replace existing summary entries for the same detail page, so
+        # partial re-runs (e.g. re-queued repairs) keep the rest of the library
+        self.save_summary(self.merge_with_summary(results))
+    
+    def scrape(self):
+        """Main scraping function"""
+        # Imported here so the offline commands never pay for loading Playwright
+        from playwright.sync_api import sync_playwright
+        
+        if self.replay_har and not self.replay_har.exists():
+            print(f"❌ HAR file not found: {self.replay_har}")
+            return
+        
+        if self.time_budget:
+            self.deadline = time.time() + self.time_budget
+        
+        with sync_playwright() as p:
+            browser, context, page = self.launch_browser(p)
+            
+            try:
+                if not self.open_library(page):
+                    return
                 
-                if not item_links:
-                    print("No items found. The page structure might have changed.")
-                    print("Please check the selectors in the code or inspect the page manually.")
-                    
-                    # Save page HTML for debugging
-                    html_file = self.output_dir / "page_debug.html"
-                    with open(html_file, 'w', encoding='utf-8') as f:
-                        f.write(page.content())
-                    print(f"Page HTML saved to {html_file} for debugging.")
+                if self.mode == 'discover':
+                    self.run_discover(page)
+                elif self.mode == 'watch':
+                    self.run_watch(page, context)
+                elif self.mode == 'work':
+                    self.run_worker(page, context)
                 else:
-                    # Limit items if max_items is set
-                    total_items = len(item_links)
-                    if self.max_items is not None and self.max_items > 0:
-                        item_links = item_links[:self.max_items]
-                        print(f"\nFound {total_items} items. Processing first {len(item_links)} items (limit: {self.max_items})...")
-                    else:
-                        print(f"\nFound {total_items} items. Processing all items...")
-                    print("="*60)
-                    
-                    processed_items = []
-                    
-                    # Process each item: go to detail page, extract prompt, download image
-                    for idx, item_link in enumerate(item_links, 1):
-                        item_data = self.process_item_detail(page, context, item_link, idx, len(item_links))
-                        processed_items.append(item_data)
-                        
-                        # Small delay between items
-                        if idx < len(item_links):
-                            time.sleep(1)
-                    
-                    # Save summary
-                    summary = {
-                        'total_items': len(processed_items),
-                        'scrape_date': time.strftime('%Y-%m-%d %H:%M:%S'),
-                        'items': processed_items
-                    }
-                    
-                    summary_file = self.output_dir / "summary.json"
-                    with open(summary_file, 'w', encoding='utf-8') as f:
-                        json.dump(summary, f, indent=2, ensure_ascii=False)
-                    
-                    print("\n" + "="*60)
-                    print(f"✓ Scraping complete!")
-                    print("="*60)
-                    print(f"  Total items processed: {len(processed_items)}")
-                    print(f"  Items with prompts: {sum(1 for item in processed_items if item.get('prompt'))}")
-                    print(f"  Items with images: {sum(1 for item in processed_items if item.get('image_filename'))}")
-                    print(f"  Images saved to: {self.images_dir}")
-                    print(f"  Prompts saved to: {self.prompts_dir}")
-                    print(f"  Summary saved to: {summary_file}")
+                    self.run_local(page, context)
             
             except Exception as e:
                 print(f"Error during scraping: {e}")
@@ -1032,40 +1998,213 @@ class SoraScraper:
                 traceback.print_exc()
             
             finally:
+                if self.selector_cache is not None:
+                    self.selector_cache.save()
+                
                 # Keep browser open for a bit so user can see results
                 print("\nClosing browser in 5 seconds...")
-                time.sleep(5)
+                self.pause(5)
+                if self.record_har:
+                    # The HAR file is written when its context closes
+                    self.har_context.close()
+                    print(f"✓ Network traffic saved to: {self.record_har}")
                 if self.use_persistent_context:
                     context.close()
                 else:
                     browser.close()
 
 
-def main():
+def parse_duration(value):
+    """Parse a duration like '90', '90s', '45m' or '2h' into seconds"""
+    import argparse
+    
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smh]?)\s*', value.lower())
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid duration: {value!r} (use e.g. 600, 45m or 2h)")
+    return float(match.group(1)) * {'': 1, 's': 1, 'm': 60, 'h': 3600}[match.group(2)]
+
+
+def read_priority_file(path):
+    """Read priority URLs (one per line, # comments allowed)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+COMMANDS = ('scrape', 'reindex', 'stats', 'verify', 'reparse', 'export', 'similar', 'related')
+
+
+def main(argv=None):
     """Main entry point"""
     import argparse
+    import sys
     
-    parser = argparse.ArgumentParser(description='Scrape images and prompts from Sora library')
-    parser.add_argument('--output', '-o', default='downloads', 
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # Without a subcommand, behave like the original single-action CLI
+    if not argv or argv[0] not in COMMANDS and argv[0] not in ('-h', '--help'):
+        argv = ['scrape'] + argv
+    
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--output', '-o', default='downloads',
                        help='Output directory (default: downloads)')
-    parser.add_argument('--persistent', '-p', action='store_true',
+    
+    parser = argparse.ArgumentParser(description='Scrape images and prompts from Sora library')
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    
+    scrape_parser = subparsers.add_parser('scrape', parents=[common],
+                                          help='Scrape the library with a browser (default)')
+    scrape_parser.add_argument('--persistent', '-p', action='store_true',
                        help='Use persistent browser context (saves login session)')
-    parser.add_argument('--browser-data', '-b', default=None,
+    scrape_parser.add_argument('--browser-data', '-b', default=None,
                        help='Directory for browser data (default: output_dir/browser_data)')
-    parser.add_argument('--limit', '-l', type=int, default=None,
+    scrape_parser.add_argument('--limit', '-l', type=int, default=None,
                        help='Maximum number of images to process (default: all)')
+    scrape_parser.add_argument('--mode', '-m', choices=['all', 'discover', 'work', 'merge', 'watch'], default='all',
+                       help='all: discover and process locally; discover: publish detail URLs to the queue; '
+                            'work: process items from the queue; merge: build summary.json from the queue; '
+                            'watch: keep running and mirror new items as they appear (default: all)')
+    scrape_parser.add_argument('--queue', '-q', default=None,
+                       help='Work queue SQLite file shared by all nodes (default: output_dir/queue.sqlite)')
+    scrape_parser.add_argument('--visibility-timeout', type=int, default=300,
+                       help='Seconds a leased item stays invisible to other workers (default: 300)')
+    scrape_parser.add_argument('--poll-interval', type=parse_duration, default=30,
+                       help='Watch mode: time between checks for new items, e.g. 30 or 2m (default: 30s)')
+    scrape_parser.add_argument('--max-poll-interval', type=parse_duration, default=600,
+                       help='Watch mode: idle polls back off up to this interval (default: 10m)')
+    scrape_parser.add_argument('--order', choices=['newest', 'oldest'], default='newest',
+                       help='Processing order by feed position (default: newest first)')
+    scrape_parser.add_argument('--priority', default=None, metavar='FILE',
+                       help='File with detail URLs (or URL fragments), one per line, to process before everything else')
+    scrape_parser.add_argument('--deadline', type=parse_duration, default=None,
+                       help='Time budget for the run, e.g. 600, 45m or 2h; stops cleanly and writes a checkpoint')
+    scrape_parser.add_argument('--resume', action='store_true',
+                       help='Process the items left over in the last checkpoint instead of scrolling the library')
+    har_group = scrape_parser.add_mutually_exclusive_group()
+    har_group.add_argument('--record-har', default=None, metavar='FILE',
+                       help='Record all network traffic of the run to a HAR file (.har, or .zip for compact bodies)')
+    har_group.add_argument('--replay-har', default=None, metavar='FILE',
+                       help='Run offline against a recorded HAR file instead of the live site')
+    scrape_parser.add_argument('--no-selector-cache', action='store_true',
+                       help='Always walk the full selector fallback chains instead of trying the last winners first')
+    scrape_parser.add_argument('--snapshots', action='store_true',
+                       help='Save a compressed DOM snapshot of each detail page (for the reparse command)')
+    scrape_parser.add_argument('--recycle-every', type=int, default=200,
+                       help='Recycle the browser page/context every N items to keep memory flat (0 = never, default: 200)')
+    scrape_parser.add_argument('--max-browser-mb', type=int, default=2048,
+                       help='Recycle early when browser memory exceeds this many MB (needs psutil, 0 = off, default: 2048)')
+    
+    subparsers.add_parser('reindex', parents=[common],
+                          help='Rebuild summary.json from prompts/ and images/')
+    subparsers.add_parser('stats', parents=[common],
+                          help='Print library statistics')
+    verify_parser = subparsers.add_parser('verify', parents=[common],
+                                          help='Check images and prompt files against summary.json')
+    verify_parser.add_argument('--decode', action='store_true',
+                       help='Also fully decode every image (needs Pillow, slower)')
+    verify_parser.add_argument('--workers', type=int, default=None,
+                       help='Number of worker processes (default: CPU count)')
+    verify_parser.add_argument('--requeue', action='store_true',
+                       help='Put missing/corrupt items on the work queue for re-download')
+    verify_parser.add_argument('--queue', '-q', default=None,
+                       help='Work queue SQLite file (default: output_dir/queue.sqlite)')
+    
+    reparse_parser = subparsers.add_parser('reparse', parents=[common],
+                                           help='Re-run prompt/image extraction over saved page snapshots')
+    reparse_parser.add_argument('--workers', type=int, default=None,
+                       help='Number of worker processes (default: CPU count)')
+    reparse_parser.add_argument('--write', action='store_true',
+                       help='Update summary.json and prompt files, and download newly found images')
+    
+    export_parser = subparsers.add_parser('export', parents=[common],
+                                          help='Write a deploy-ready static copy or an archive of the library')
+    export_parser.add_argument('destination',
+                       help='Export directory for a static copy, or an archive file (.zip, .tar, .tar.gz, .tar.zst; - for stdout)')
+    export_parser.add_argument('--format', '-f', choices=['static', 'zip', 'tar', 'tar.gz', 'tar.zst'], default=None,
+                       help='Export format (default: inferred from the destination name)')
+    export_parser.add_argument('--since', default=None,
+                       help='Archive only items scraped on/after this date (YYYY-MM-DD or "YYYY-MM-DD HH:MM:SS")')
+    export_parser.add_argument('--until', default=None,
+                       help='Archive only items scraped on/before this date')
+    export_parser.add_argument('--query', default=None,
+                       help='Archive only items whose prompt contains this text')
+    export_parser.add_argument('--ids', default=None,
+                       help='Archive only these item ids, e.g. 1,4,10-20')
+    export_parser.add_argument('--incremental', action='store_true',
+                       help='Archive only items added since the last archive export')
+    
+    similar_parser = subparsers.add_parser('similar', parents=[common],
+                                           help='Find near-duplicate downloaded images')
+    similar_parser.add_argument('image', nargs='?', default=None,
+                       help='Image path or filename in images/ (omit to print all groups of near-duplicates)')
+    similar_parser.add_argument('--max-distance', type=int, default=None,
+                       help='Maximum perceptual hash distance for near-duplicates (default: 6)')
+    
+    related_parser = subparsers.add_parser('related', parents=[common],
+                                           help='Find items with related (near-duplicate or iterated) prompts')
+    related_parser.add_argument('target',
+                       help='Item id, or a prompt text to search for')
+    related_parser.add_argument('--threshold', type=float, default=None,
+                       help='Minimum estimated similarity of word pairs, 0-1 (default: 0.5)')
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    
+    if args.command != 'scrape':
+        scraper = SoraScraper(output_dir=args.output, queue_path=getattr(args, 'queue', None), create_dirs=False)
+        if args.command == 'reindex':
+            scraper.reindex()
+        elif args.command == 'stats':
+            scraper.print_stats()
+        elif args.command == 'verify':
+            report = scraper.verify_library(workers=args.workers, decode=args.decode, requeue=args.requeue)
+            if report is None or report['missing'] or report['corrupt'] or report['prompt_drift']:
+                sys.exit(1)
+        elif args.command == 'reparse':
+            scraper.reparse_snapshots(workers=args.workers, write=args.write)
+        elif args.command == 'export':
+            import export
+            
+            fmt = args.format
+            if fmt is None and (args.destination == '-' or export.archive_format_for(args.destination)):
+                fmt = 'tar' if args.destination == '-' else export.archive_format_for(args.destination)
+            if fmt in (None, 'static'):
+                scraper.export_static(args.destination)
+            else:
+                scraper.export_archive(args.destination, fmt, since=args.since, until=args.until,
+                                       query=args.query, ids=args.ids, incremental=args.incremental)
+        elif args.command == 'similar':
+            if args.image:
+                scraper.find_similar(args.image, args.max_distance)
+            else:
+                scraper.print_similar_groups(args.max_distance)
+        elif args.command == 'related':
+            scraper.related_prompts(args.target, args.threshold)
+        return
     
     scraper = SoraScraper(
         output_dir=args.output,
         use_persistent_context=args.persistent,
         browser_data_dir=args.browser_data,
-        max_items=args.limit
+        max_items=args.limit,
+        mode=args.mode,
+        queue_path=args.queue,
+        visibility_timeout=args.visibility_timeout,
+        recycle_every=args.recycle_every,
+        max_browser_mb=args.max_browser_mb,
+        save_snapshots=args.snapshots,
+        order=args.order,
+        priority_urls=read_priority_file(args.priority) if args.priority else None,
+        deadline=args.deadline,
+        resume=args.resume,
+        use_selector_cache=not args.no_selector_cache,
+        poll_interval=args.poll_interval,
+        max_poll_interval=max(args.poll_interval, args.max_poll_interval),
+        record_har=args.record_har,
+        replay_har=args.replay_har
     )
-    scraper.scrape()
+    if args.mode == 'merge':
+        scraper.merge_queue()
+    else:
+        scraper.scrape()
 
 
 if __name__ == '__main__':
     main()
-
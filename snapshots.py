@@ -0,0 +1,451 @@
+"""
+Snapshots
+Compressed DOM snapshots of detail pages and offline re-parsing of them (no browser),
+using the same selector chains as the live scraper
+"""
+
+import functools
+import gzip
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from pathlib import Path
+
+try:
+    # Optional: parses and matches selectors in C, several times faster on large libraries
+    import lxml.etree
+except ImportError:
+    lxml = None
+
+from extraction import (
+    PROMPT_SELECTORS, PROMPT_BUTTON_SELECTORS, IMAGE_SRC_ATTRIBUTES,
+    absolute_url, is_prompt_button_text, longest_prompt_line, pick_srcset_url,
+)
+
+SNAPSHOT_SUFFIX = '.html.gz'
+META_PREFIX = '<!-- sora-snapshot '
+META_SUFFIX = ' -->\n'
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+SKIP_TEXT_TAGS = {'script', 'style', 'noscript', 'template', 'head', 'svg'}
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'dd', 'div', 'dl', 'dt', 'fieldset', 'figcaption', 'figure',
+    'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol', 'p', 'pre',
+    'section', 'table', 'tr', 'ul',
+}
+
+
+def save_snapshot(path, html, meta):
+    """Write a gzip-compressed page snapshot with a metadata comment as the first line"""
+    header = META_PREFIX + json.dumps(meta, ensure_ascii=False) + META_SUFFIX
+    with gzip.open(path, 'wt', encoding='utf-8', compresslevel=6) as f:
+        f.write(header)
+        f.write(html)
+
+
+def read_snapshot(path):
+    """Return (meta, html) for a snapshot written by save_snapshot"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        content = f.read()
+    meta = {}
+    if content.startswith(META_PREFIX):
+        end = content.index(META_SUFFIX)
+        meta = json.loads(content[len(META_PREFIX):end])
+        content = content[end + len(META_SUFFIX):]
+    return meta, content
+
+
+class Node:
+    __slots__ = ('tag', 'attrs', 'children', 'parent', 'text')
+
+    def __init__(self, tag, attrs, parent):
+        self.tag = tag
+        self.attrs = attrs
+        self.children = []
+        self.parent = parent
+        self.text = None  # text_content, filled in on first use
+
+
+class TreeBuilder(HTMLParser):
+    """Builds a minimal element tree; tolerant of unclosed tags like browsers' serialized DOM"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node('#document', {}, None)
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, {name: value or '' for name, value in attrs}, self.stack[-1])
+        self.stack[-1].children.append(node)
+        if tag not in VOID_TAGS:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        node = Node(tag, {name: value or '' for name, value in attrs}, self.stack[-1])
+        self.stack[-1].children.append(node)
+
+    def handle_endtag(self, tag):
+        for depth in range(len(self.stack) - 1, 0, -1):
+            if self.stack[depth].tag == tag:
+                del self.stack[depth:]
+                return
+
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
+
+
+class LxmlNode:
+    """Node-compatible view of an lxml element; children are wrapped on first access"""
+    __slots__ = ('element', 'text', '_children')
+
+    def __init__(self, element):
+        self.element = element
+        self.text = None  # text_content, filled in on first use
+        self._children = None
+
+    def __eq__(self, other):
+        return isinstance(other, LxmlNode) and other.element is self.element
+
+    def __hash__(self):
+        return id(self.element)
+
+    @property
+    def tag(self):
+        return self.element.tag
+
+    @property
+    def attrs(self):
+        return self.element.attrib
+
+    @property
+    def parent(self):
+        parent = self.element.getparent()
+        return LxmlNode(parent) if parent is not None else None
+
+    @property
+    def children(self):
+        if self._children is None:
+            children = [self.element.text] if self.element.text else []
+            for child in self.element:
+                # Comments and processing instructions only contribute their tail text
+                if isinstance(child.tag, str):
+                    children.append(LxmlNode(child))
+                if child.tail:
+                    children.append(child.tail)
+            self._children = children
+        return self._children
+
+
+def parse_html(html):
+    """Parse a page into Node objects, or LxmlNode views when lxml is installed"""
+    if lxml is not None:
+        parser = lxml.etree.HTMLParser(huge_tree=True)
+        try:
+            document = lxml.etree.fromstring(html, parser)
+        except (lxml.etree.XMLSyntaxError, ValueError):
+            # Strings with an XML encoding declaration
+            document = None
+        # libxml2 drops everything below its nesting limit; such pages take the Python parser
+        if document is not None and not any(error.level == lxml.etree.ErrorLevels.FATAL for error in parser.error_log):
+            return LxmlNode(document)
+    builder = TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+def iter_elements(root):
+    """Yield element nodes in document order"""
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node is not root:
+            yield node
+        stack.extend(child for child in reversed(node.children) if isinstance(child, Node))
+
+
+def text_content(node):
+    """Text of a subtree; memoized on every element below node, so repeated :has-text checks are cheap"""
+    if node.text is not None:
+        return node.text
+    # Post-order walk: children's text is known by the time their parent is joined
+    stack = [(node, False)]
+    while stack:
+        current, children_done = stack.pop()
+        if current.tag in SKIP_TEXT_TAGS:
+            current.text = ''
+        elif children_done:
+            current.text = ''.join(child if isinstance(child, str) else child.text for child in current.children)
+        else:
+            stack.append((current, True))
+            stack.extend((child, False) for child in current.children
+                         if not isinstance(child, str) and child.text is None)
+    return node.text
+
+
+def inner_text(node):
+    """Approximate innerText: block elements and <br> start new lines, whitespace is collapsed"""
+    parts = []
+    # Iterative, so deeply nested DOMs do not hit the recursion limit
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, str):
+            parts.append(current)
+        elif current.tag == 'br':
+            parts.append('\n')
+        elif current.tag not in SKIP_TEXT_TAGS:
+            if current.tag in BLOCK_TAGS:
+                parts.append('\n')
+                # Popped after the children: the newline that closes the block
+                stack.append('\n')
+            stack.extend(reversed(current.children))
+    lines = (re.sub(r'\s+', ' ', line).strip() for line in ''.join(parts).split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+# Compound selectors used by the extraction chains: tag.class[attr op "value" i]:has-text("text")
+COMPOUND_RE = re.compile(
+    r'^(?P<tag>[\w-]+)?(?:\.(?P<cls>[\w-]+))?'
+    r'(?:\[(?P<attr>[\w-]+)(?:(?P<op>[*^$]?=)"(?P<value>[^"]*)"(?P<flag>\s+i)?)?\])?'
+    r'(?::has-text\("(?P<text>[^"]*)"\))?$'
+)
+
+
+def compile_selector(selector):
+    """Compile a simple CSS/Playwright selector (descendant combinators allowed) into compounds"""
+    compounds = []
+    for part in re.findall(r'(?:[^\s\[]|\[[^\]]*\])+', selector):
+        match = COMPOUND_RE.match(part)
+        if not match:
+            raise ValueError(f"Unsupported selector: {selector}")
+        compounds.append(match.groupdict())
+    return compounds
+
+
+def matches_compound(node, compound):
+    if compound['tag'] and node.tag != compound['tag']:
+        return False
+    if compound['cls'] and compound['cls'] not in node.attrs.get('class', '').split():
+        return False
+    if compound['attr']:
+        if compound['attr'] not in node.attrs:
+            return False
+        if compound['op']:
+            actual = node.attrs[compound['attr']]
+            expected = compound['value']
+            if compound['flag']:
+                actual, expected = actual.lower(), expected.lower()
+            op = compound['op']
+            if op == '=' and actual != expected:
+                return False
+            if op == '*=' and expected not in actual:
+                return False
+            if op == '^=' and not actual.startswith(expected):
+                return False
+            if op == '$=' and not actual.endswith(expected):
+                return False
+    if compound['text'] is not None and compound['text'].lower() not in text_content(node).lower():
+        return False
+    return True
+
+
+def matches(node, compounds):
+    if not matches_compound(node, compounds[-1]):
+        return False
+    remaining = compounds[:-1]
+    ancestor = node.parent
+    while remaining and ancestor is not None and ancestor.tag != '#document':
+        if matches_compound(ancestor, remaining[-1]):
+            remaining = remaining[:-1]
+        ancestor = ancestor.parent
+    return not remaining
+
+
+def query_selector_all(root, selector):
+    compounds = compile_selector(selector)
+    return [node for node in iter_elements(root) if matches(node, compounds)]
+
+
+def query_selector(root, selector):
+    compounds = compile_selector(selector)
+    for node in iter_elements(root):
+        if matches(node, compounds):
+            return node
+    return None
+
+
+UPPERCASE = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def _lowercase(expression):
+    return f"translate({expression}, '{UPPERCASE}', '{UPPERCASE.lower()}')"
+
+
+@functools.lru_cache(maxsize=None)
+def selector_xpath(selector):
+    """Compiled XPath for a selector.
+
+    :has-text compares the element's whole string value here, which also includes
+    script/style text, so matches are re-checked against text_content afterwards.
+    """
+    steps = []
+    for compound in compile_selector(selector):
+        conditions = []
+        if compound['cls']:
+            conditions.append(f"contains(concat(' ', normalize-space(@class), ' '), ' {compound['cls']} ')")
+        if compound['attr']:
+            attr = '@' + compound['attr']
+            # The bare existence test is cheap and rules out most elements before any string work
+            conditions.append(attr)
+            if compound['op']:
+                value = compound['value']
+                if compound['flag']:
+                    attr, value = _lowercase(attr), value.lower()
+                conditions.append({
+                    '=': f'{attr} = "{value}"',
+                    '*=': f'contains({attr}, "{value}")',
+                    '^=': f'starts-with({attr}, "{value}")',
+                    '$=': f'substring({attr}, string-length({attr}) - {len(value) - 1}) = "{value}"',
+                }[compound['op']])
+        if compound['text'] is not None:
+            conditions.append(f'contains({_lowercase("string(.)")}, "{compound["text"].lower()}")')
+        steps.append((compound['tag'] or '*') + ''.join(f'[{condition}]' for condition in conditions))
+    # descendant:: rather than //, which libxml2 cannot optimize when steps have predicates
+    return lxml.etree.XPath('/descendant::' + '/descendant::'.join(steps))
+
+
+def _select_many_lxml(root, selectors):
+    results = {}
+    for selector in selectors:
+        compounds = compile_selector(selector)
+        nodes = [LxmlNode(element) for element in selector_xpath(selector)(root.element)]
+        if any(compound['text'] is not None for compound in compounds):
+            nodes = [node for node in nodes if matches(node, compounds)]
+        results[selector] = nodes
+    return results
+
+
+def select_many(root, selectors):
+    """Match several selectors in one walk of the tree; returns {selector: [nodes in document order]}.
+
+    Selectors are bucketed by the tag of their last compound, so each element is
+    only tested against the selectors that can match its tag. Trees parsed with lxml
+    are matched with compiled XPath instead.
+    """
+    if isinstance(root, LxmlNode):
+        return _select_many_lxml(root, selectors)
+    results = {selector: [] for selector in selectors}
+    by_tag = {}
+    any_tag = []
+    for selector in results:
+        compounds = compile_selector(selector)
+        entry = (compounds, results[selector])
+        if compounds[-1]['tag']:
+            by_tag.setdefault(compounds[-1]['tag'], []).append(entry)
+        else:
+            any_tag.append(entry)
+
+    for node in iter_elements(root):
+        for compounds, found in by_tag.get(node.tag, ()):
+            if matches(node, compounds):
+                found.append(node)
+        for compounds, found in any_tag:
+            if matches(node, compounds):
+                found.append(node)
+    return results
+
+
+def next_button_text(node):
+    """Offline equivalent of NEXT_BUTTON_SCRIPT: text of the next sibling button, or of the parent's"""
+    for current in (node, node.parent):
+        if current is None or current.parent is None:
+            continue
+        siblings = [child for child in current.parent.children if not isinstance(child, str)]
+        for sibling in siblings[siblings.index(current) + 1:]:
+            if sibling.tag == 'button':
+                return inner_text(sibling)
+    return None
+
+
+def extract_from_html(html):
+    """Run the prompt and image-URL extraction chain over a page snapshot.
+
+    Mirrors SoraScraper.process_item_detail. Without layout information, the
+    "largest visible image" fallback becomes the first WebP image, then the first image.
+    """
+    root = parse_html(html)
+    found = select_many(root, PROMPT_SELECTORS + PROMPT_BUTTON_SELECTORS + ['img', 'body'])
+    prompt_text = None
+
+    for selector in PROMPT_SELECTORS:
+        if not found[selector]:
+            continue
+        prompt_elem = found[selector][0]
+        text = inner_text(prompt_elem).strip()
+        if text and len(text) > 10:
+            prompt_text = text
+            button_text = next_button_text(prompt_elem)
+            if button_text and len(button_text) > len(text):
+                prompt_text = button_text.strip()
+            break
+
+    if not prompt_text or len(prompt_text) < 20:
+        for selector in PROMPT_BUTTON_SELECTORS:
+            for button in found[selector]:
+                button_text = inner_text(button).strip()
+                if is_prompt_button_text(button_text):
+                    prompt_text = button_text
+                    break
+            if prompt_text:
+                break
+
+    if not prompt_text or len(prompt_text) < 10:
+        body = found['body'][0] if found['body'] else root
+        prompt_text = longest_prompt_line(inner_text(body)) or prompt_text
+
+    images = found['img']
+    candidates = [img for img in images if 'Generated image' in img.attrs.get('alt', '')]
+    if not candidates:
+        candidates = [img for img in images
+                      if '.webp' in (img.attrs.get('src') or img.attrs.get('data-src') or '').lower()] or images
+
+    image_url = None
+    if candidates:
+        img = candidates[0]
+        for attr in IMAGE_SRC_ATTRIBUTES:
+            value = img.attrs.get(attr, '').strip()
+            if value:
+                image_url = value
+                break
+        if not image_url and img.attrs.get('srcset'):
+            image_url, _ = pick_srcset_url(img.attrs['srcset'])
+        if image_url:
+            image_url = absolute_url(image_url)
+
+    return {'prompt': prompt_text or '', 'image_url': image_url or ''}
+
+
+def reparse_snapshot(path):
+    """Process pool task: snapshot metadata merged with the extraction result"""
+    try:
+        meta, html = read_snapshot(path)
+        result = extract_from_html(html)
+        result.update(meta)
+        result['error'] = None
+    except Exception as e:
+        result = {'prompt': '', 'image_url': '', 'error': f'{type(e).__name__}: {e}'}
+    result['snapshot'] = os.path.basename(path)
+    return result
+
+
+def reparse_snapshots(snapshot_dir, workers=None):
+    """Re-run extraction over every snapshot in snapshot_dir across a process pool"""
+    paths = sorted(str(path) for path in Path(snapshot_dir).glob('*' + SNAPSHOT_SUFFIX))
+    if not paths:
+        return []
+    chunksize = max(1, min(64, len(paths) // ((os.cpu_count() or 1) * 4)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(reparse_snapshot, paths, chunksize=chunksize))
@@ -0,0 +1,225 @@
+"""
+Summary Columns
+Compact columnar copy of summary.json (summary.cols) and a memory-mapped reader
+that serves columns straight from the file without parsing JSON
+"""
+
+import functools
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from pathlib import Path
+
+COLUMNS_FILE = "summary.cols"
+MAGIC = b'SORACOL1'
+
+# Header: magic, row count, column count; then one directory entry per column
+HEADER = struct.Struct('<8sQQ')
+# Column entry: name, kind (b'i' = int64 values, b's' = string offsets), data offset, blob offset, blob size
+COLUMN_ENTRY = struct.Struct('<24scxxxxxxxQQQ')
+
+# Missing numbers are stored as -1
+INT_COLUMNS = ('id', 'timestamp', 'image_size', 'feed_position', 'prompt_cluster')
+STRING_COLUMNS = ('detail_url', 'image_filename', 'prompt')
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_timestamp(value):
+    """Item timestamp ('YYYYmmdd_HHMMSS', local time) as Unix seconds, or -1"""
+    try:
+        return int(time.mktime(time.strptime(value, '%Y%m%d_%H%M%S')))
+    except (TypeError, ValueError):
+        return -1
+
+
+def int_value(item, name, image_sizes):
+    if name == 'timestamp':
+        return parse_timestamp(item.get('timestamp'))
+    if name == 'image_size':
+        return image_sizes.get(item.get('image_filename'), -1)
+    value = item.get(name)
+    return value if isinstance(value, int) else -1
+
+
+def _pad(f):
+    """Align the next write to 8 bytes so int64 columns can be cast in place"""
+    f.write(b'\0' * (-f.tell() % 8))
+
+
+def write_columns(path, items, image_sizes=None):
+    """Write items in the columnar format.
+
+    Number columns are int64 arrays. Each string column stores row_count + 1 int64
+    offsets into its own UTF-8 blob, so string i is blob[offsets[i]:offsets[i + 1]].
+    image_sizes maps image filenames to byte sizes (missing images get -1).
+    """
+    path = Path(path)
+    image_sizes = image_sizes or {}
+    columns = [(name, b'i') for name in INT_COLUMNS] + [(name, b's') for name in STRING_COLUMNS]
+    entries = []
+
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(b'\0' * (HEADER.size + COLUMN_ENTRY.size * len(columns)))
+
+        for name, kind in columns:
+            _pad(f)
+            data_offset = f.tell()
+            if kind == b'i':
+                values = array('q', (int_value(item, name, image_sizes) for item in items))
+                if sys.byteorder != 'little':
+                    values.byteswap()
+                f.write(values.tobytes())
+                entries.append((name, kind, data_offset, 0, 0))
+                continue
+
+            encoded = [(item.get(name) or '').encode('utf-8') for item in items]
+            offsets = array('q', [0])
+            for value in encoded:
+                offsets.append(offsets[-1] + len(value))
+            if sys.byteorder != 'little':
+                offsets.byteswap()
+            f.write(offsets.tobytes())
+            blob_offset = f.tell()
+            for value in encoded:
+                f.write(value)
+            entries.append((name, kind, data_offset, blob_offset, f.tell() - blob_offset))
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, len(items), len(columns)))
+        for name, kind, data_offset, blob_offset, blob_size in entries:
+            f.write(COLUMN_ENTRY.pack(name.encode('ascii'), kind, data_offset, blob_offset, blob_size))
+    os.replace(tmp_path, path)
+    return path
+
+
+class StringColumn:
+    """Lazily decoded string column; raw() returns zero-copy UTF-8 bytes"""
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def raw(self, index):
+        if index < 0:
+            index += len(self)
+        return self.blob[self.offsets[index]:self.offsets[index + 1]]
+
+    def __getitem__(self, index):
+        return str(self.raw(index), 'utf-8')
+
+    def __iter__(self):
+        offsets, blob = self.offsets, self.blob
+        for index in range(len(self)):
+            yield str(blob[offsets[index]:offsets[index + 1]], 'utf-8')
+
+    def lengths(self):
+        """Byte length of every value, without decoding any"""
+        offsets = self.offsets
+        return [offsets[index + 1] - offsets[index] for index in range(len(self))]
+
+
+class SummaryColumns:
+    """Memory-mapped reader for summary.cols.
+
+        with SummaryColumns('downloads/summary.cols') as table:
+            sizes = table['image_size']        # int64 memoryview, no copy
+            names = table['image_filename']    # StringColumn, decoded on access
+
+    Opening only reads the header; pages of the file are loaded by the OS as
+    columns are touched. Views must not be used after close().
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.file = open(self.path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file
+            self.file.close()
+            raise ValueError(f"Not a summary columns file: {self.path}")
+        self.buffer = memoryview(self.map)
+
+        magic, self.row_count, column_count = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"Not a summary columns file: {self.path}")
+        self.columns = {}
+        for number in range(column_count):
+            name, kind, data_offset, blob_offset, blob_size = COLUMN_ENTRY.unpack_from(
+                self.buffer, HEADER.size + number * COLUMN_ENTRY.size)
+            self.columns[name.rstrip(b'\0').decode('ascii')] = (kind, data_offset, blob_offset, blob_size)
+        self.cache = {}
+
+    def __len__(self):
+        return self.row_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def names(self):
+        return list(self.columns)
+
+    def _ints(self, offset, count):
+        view = self.buffer[offset:offset + count * 8]
+        if sys.byteorder == 'little':
+            return view.cast('q')
+        values = array('q', view)
+        values.byteswap()
+        return values
+
+    def __getitem__(self, name):
+        """int64 memoryview for number columns, StringColumn for string columns"""
+        if name not in self.cache:
+            kind, data_offset, blob_offset, blob_size = self.columns[name]
+            if kind == b'i':
+                self.cache[name] = self._ints(data_offset, self.row_count)
+            else:
+                self.cache[name] = StringColumn(self._ints(data_offset, self.row_count + 1),
+                                                self.buffer[blob_offset:blob_offset + blob_size])
+        return self.cache[name]
+
+    def row(self, index):
+        """One item as a dict (missing numbers as None)"""
+        row = {}
+        for name in self.columns:
+            value = self[name][index]
+            row[name] = None if value == -1 and self.columns[name][0] == b'i' else value
+        return row
+
+    def close(self):
+        # Views into the map must be released before it can be closed
+        for value in self.cache.values():
+            for view in (getattr(value, 'offsets', None), getattr(value, 'blob', None), value):
+                if isinstance(view, memoryview):
+                    view.release()
+        self.cache = {}
+        if getattr(self, 'buffer', None) is not None:
+            self.buffer.release()
+            self.buffer = None
+            try:
+                self.map.close()
+            except BufferError:
+                # A caller still holds a view (e.g. from raw()); the map closes once it is freed
+                pass
+        self.file.close()
+
+
+def write_summary_columns(output_dir, items):
+    """Write summary.cols next to summary.json, with image sizes taken from images/"""
+    output_dir = Path(output_dir)
+    images_dir = output_dir / "images"
+    image_sizes = {}
+    if images_dir.exists():
+        image_sizes = {entry.name: entry.stat().st_size for entry in os.scandir(images_dir) if entry.is_file()}
+    return write_columns(output_dir / COLUMNS_FILE, items, image_sizes)
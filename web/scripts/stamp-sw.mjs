@@ -0,0 +1,41 @@
+// Stamps the built service worker with this build's app shell.
+//
+// Run after `ng build` (`npm run build` does both). Lists the top-level files of the
+// build output (bundles, styles, favicon) and writes them, plus a hash of their contents
+// and index.html, into dist/sora-gallery/sw.js. The service worker precaches exactly
+// these files and drops everything else from its shell cache when it activates.
+
+import { createHash } from 'node:crypto';
+import { readdirSync, readFileSync, statSync, writeFileSync } from 'node:fs';
+import { join } from 'node:path';
+import { fileURLToPath } from 'node:url';
+
+const OUTPUT_DIR = fileURLToPath(new URL('../dist/sora-gallery/', import.meta.url));
+const SW_FILE = 'sw.js';
+// index.html is always in the worker's shell list; assets/ (including the library) never is
+const SHELL_FILE_RE = /\.(js|css|ico)$/;
+
+const VERSION_PLACEHOLDER = "const VERSION = 'dev';";
+const SHELL_PLACEHOLDER = 'const SHELL_FILES = [];';
+
+const shellFiles = readdirSync(OUTPUT_DIR)
+  .filter((name) => name !== SW_FILE && SHELL_FILE_RE.test(name) && statSync(join(OUTPUT_DIR, name)).isFile())
+  .sort();
+
+const hash = createHash('sha256');
+for (const name of ['index.html', ...shellFiles]) {
+  hash.update(name);
+  hash.update(readFileSync(join(OUTPUT_DIR, name)));
+}
+const version = hash.digest('hex').slice(0, 12);
+
+const swPath = join(OUTPUT_DIR, SW_FILE);
+const source = readFileSync(swPath, 'utf8');
+if (!source.includes(VERSION_PLACEHOLDER) || !source.includes(SHELL_PLACEHOLDER)) {
+  console.error(`${swPath} has no VERSION/SHELL_FILES placeholders (already stamped?)`);
+  process.exit(1);
+}
+writeFileSync(swPath, source
+  .replace(VERSION_PLACEHOLDER, `const VERSION = '${version}';`)
+  .replace(SHELL_PLACEHOLDER, `const SHELL_FILES = ${JSON.stringify(shellFiles)};`));
+console.log(`Stamped ${SW_FILE} with version ${version} (${shellFiles.length} shell files)`);
@@ -1,5 +1,6 @@
-import { Component, signal, computed, effect } from '@angular/core';
+import { Component, ElementRef, OnDestroy, ViewChild, signal, computed, effect } from '@angular/core';
 import { CommonModule } from '@angular/common';
+import type { SearchRequest, SearchResponse } from './search-messages';
 
 type SummaryItem = {
   id: number;
@@ -10,6 +11,18 @@ type SummaryItem = {
   detail_url?: string;
 };
 
+type ViewMode = 'pages' | 'virtual';
+
+// Virtual grid geometry; must stay in sync with .virtual-* rules in styles.css
+const VIRTUAL_MIN_COLUMN_WIDTH = 280;
+const VIRTUAL_GAP = 16;
+const VIRTUAL_PADDING_X = 24;
+const VIRTUAL_ROW_HEIGHT = 380 + VIRTUAL_GAP;
+const VIRTUAL_OVERSCAN_ROWS = 2;
+
+// Idle time after the last keystroke before a search is sent to the worker
+const SEARCH_DEBOUNCE_MS = 120;
+
 type Summary = {
   total_items: number;
   scrape_date: string;
@@ -23,7 +36,7 @@ type Summary = {
   templateUrl: './app.component.html',
   styleUrls: ['./app.component.css']
 })
-export class AppComponent {
+export class AppComponent implements OnDestroy {
   readonly title = 'Sora Gallery';
 
   readonly loading = signal(true);
@@ -33,14 +46,87 @@ export class AppComponent {
   readonly currentPage = signal(1);
   readonly itemsPerPage = signal(24);
   readonly viewingImage = signal<SummaryItem | null>(null);
+  readonly viewMode = signal<ViewMode>('pages');
+
+  // Virtual grid viewport state (updated from scroll/resize, coalesced per frame)
+  readonly viewportTop = signal(0);
+  readonly viewportHeight = signal(0);
+  readonly viewportWidth = signal(0);
+
+  // Matches streamed back by the search worker; null while no query is active
+  readonly searchResults = signal<SummaryItem[] | null>(null);
+  readonly searching = signal(false);
+
+  readonly filtered = computed(() => this.searchResults() ?? this.items());
+
+  private readonly itemsById = computed(() => new Map(this.items().map(i => [i.id, i])));
+
+  // id -> position in filtered(), so viewer navigation is O(1) instead of findIndex
+  readonly filteredIndex = computed(() => {
+    const index = new Map<number, number>();
+    this.filtered().forEach((item, i) => index.set(item.id, i));
+    return index;
+  });
+
+  readonly viewingIndex = computed(() => {
+    const current = this.viewingImage();
+    if (!current) return -1;
+    return this.filteredIndex().get(current.id) ?? -1;
+  });
+
+  readonly virtualColumns = computed(() => {
+    const width = this.viewportWidth() - VIRTUAL_PADDING_X * 2;
+    return Math.max(1, Math.floor((width + VIRTUAL_GAP) / (VIRTUAL_MIN_COLUMN_WIDTH + VIRTUAL_GAP)));
+  });
+
+  readonly virtualTotalHeight = computed(() => {
+    const rows = Math.ceil(this.filtered().length / this.virtualColumns());
+    return rows * VIRTUAL_ROW_HEIGHT;
+  });
+
+  readonly virtualFirstRow = computed(() =>
+    Math.max(0, Math.floor(this.viewportTop() / VIRTUAL_ROW_HEIGHT) - VIRTUAL_OVERSCAN_ROWS)
+  );
+
+  readonly virtualLastRow = computed(() =>
+    Math.ceil((this.viewportTop() + this.viewportHeight()) / VIRTUAL_ROW_HEIGHT) + VIRTUAL_OVERSCAN_ROWS
+  );
 
-  readonly filtered = computed(() => {
-    const q = this.query().toLowerCase().trim();
-    return q
-      ? this.items().filter(i => (i.prompt || '').toLowerCase().includes(q))
-      : this.items();
+  // Only the rows in (and just around) the viewport are rendered
+  readonly virtualItems = computed(() => {
+    const cols = this.virtualColumns();
+    const start = this.virtualFirstRow() * cols;
+    const end = (this.virtualLastRow() + 1) * cols;
+    return this.filtered().slice(start, end);
   });
 
+  readonly virtualOffset = computed(() => this.virtualFirstRow() * VIRTUAL_ROW_HEIGHT);
+
+  private searchWorker: Worker | null = null;
+  private searchSeq = 0;
+  private searchSeqReceived = 0;
+  private searchTimer: ReturnType<typeof setTimeout> | null = null;
+  // Fallback without Worker support: prompts lower-cased once per load
+  private normalizedPrompts: string[] = [];
+
+  private viewportEl: HTMLElement | null = null;
+  private resizeObserver: ResizeObserver | null = null;
+  private scrollFrame: number | null = null;
+
+  @ViewChild('viewport')
+  set viewportRef(ref: ElementRef<HTMLElement> | undefined) {
+    this.resizeObserver?.disconnect();
+    this.resizeObserver = null;
+    this.viewportEl = ref?.nativeElement ?? null;
+    if (!this.viewportEl) return;
+
+    this.measureViewport();
+    if (typeof ResizeObserver !== 'undefined') {
+      this.resizeObserver = new ResizeObserver(() => this.measureViewport());
+      this.resizeObserver.observe(this.viewportEl);
+    }
+  }
+
   readonly paginated = computed(() => {
     const filtered = this.filtered();
     const page = this.currentPage();
@@ -65,24 +151,19 @@ export class AppComponent {
     return { start, end, total: filtered.length };
   });
 
-  readonly canNavigatePrev = computed(() => {
-    const current = this.viewingImage();
-    if (!current) return false;
-    const filtered = this.filtered();
-    const currentIndex = filtered.findIndex(i => i.id === current.id);
-    return currentIndex > 0;
-  });
+  readonly canNavigatePrev = computed(() => this.viewingIndex() > 0);
 
   readonly canNavigateNext = computed(() => {
-    const current = this.viewingImage();
-    if (!current) return false;
-    const filtered = this.filtered();
-    const currentIndex = filtered.findIndex(i => i.id === current.id);
-    return currentIndex < filtered.length - 1;
+    const currentIndex = this.viewingIndex();
+    return currentIndex >= 0 && currentIndex < this.filtered().length - 1;
   });
 
   constructor() {
+    this.startSearchWorker();
     this.load();
+    if (typeof navigator !== 'undefined' && 'serviceWorker' in navigator) {
+      navigator.serviceWorker.addEventListener('message', this.onServiceWorkerMessage);
+    }
     // Listen for ESC key to close viewer
     if (typeof window !== 'undefined') {
       window.addEventListener('keydown', (e) => {
@@ -97,6 +178,107 @@ export class AppComponent {
     const target = event.target as HTMLInputElement;
     this.query.set(target.value);
     this.currentPage.set(1); // Reset to first page on search
+    this.resetVirtualScroll();
+
+    if (this.searchTimer !== null) clearTimeout(this.searchTimer);
+    this.searchTimer = setTimeout(() => {
+      this.searchTimer = null;
+      this.runSearch();
+    }, SEARCH_DEBOUNCE_MS);
+  }
+
+  private startSearchWorker() {
+    if (typeof Worker === 'undefined') return;
+    this.searchWorker = new Worker(new URL('./search.worker', import.meta.url), { type: 'module' });
+    this.searchWorker.onmessage = ({ data }: MessageEvent<SearchResponse>) => this.onSearchResults(data);
+  }
+
+  private setSearchIndex(items: SummaryItem[]) {
+    if (this.searchWorker) {
+      const message: SearchRequest = { type: 'index', items: items.map(i => ({ id: i.id, prompt: i.prompt })) };
+      this.searchWorker.postMessage(message);
+    } else {
+      this.normalizedPrompts = items.map(i => (i.prompt || '').toLowerCase());
+    }
+  }
+
+  private runSearch() {
+    const q = this.query().trim();
+    // Any newer sequence number makes the worker drop the running scan
+    const seq = ++this.searchSeq;
+    if (!q) {
+      this.searchWorker?.postMessage({ type: 'cancel', seq } as SearchRequest);
+      this.searchResults.set(null);
+      this.searching.set(false);
+      return;
+    }
+    if (!this.searchWorker) {
+      const needle = q.toLowerCase();
+      this.searchResults.set(this.items().filter((_, i) => this.normalizedPrompts[i].includes(needle)));
+      return;
+    }
+    this.searching.set(true);
+    const message: SearchRequest = { type: 'query', seq, query: q };
+    this.searchWorker.postMessage(message);
+  }
+
+  private onSearchResults(response: SearchResponse) {
+    // Results of a superseded query
+    if (response.seq !== this.searchSeq) return;
+
+    const byId = this.itemsById();
+    const matches = response.ids.map(id => byId.get(id)).filter((i): i is SummaryItem => !!i);
+    if (this.searchSeqReceived !== response.seq) {
+      // First chunk replaces the previous query's results; later chunks extend them
+      this.searchSeqReceived = response.seq;
+      this.searchResults.set(matches);
+    } else if (matches.length) {
+      this.searchResults.update(current => (current ?? []).concat(matches));
+    }
+    if (response.done) this.searching.set(false);
+  }
+
+  onViewModeChange(event: Event) {
+    const target = event.target as HTMLSelectElement;
+    this.viewMode.set(target.value as ViewMode);
+    this.currentPage.set(1);
+    this.resetVirtualScroll();
+  }
+
+  onVirtualScroll() {
+    // Coalesce scroll events to one signal update per animation frame
+    if (this.scrollFrame !== null) return;
+    this.scrollFrame = requestAnimationFrame(() => {
+      this.scrollFrame = null;
+      this.measureViewport();
+    });
+  }
+
+  trackById(_index: number, item: SummaryItem): number {
+    return item.id;
+  }
+
+  ngOnDestroy() {
+    this.resizeObserver?.disconnect();
+    if (this.searchTimer !== null) clearTimeout(this.searchTimer);
+    this.searchWorker?.terminate();
+    if (typeof navigator !== 'undefined' && 'serviceWorker' in navigator) {
+      navigator.serviceWorker.removeEventListener('message', this.onServiceWorkerMessage);
+    }
+    if (this.scrollFrame !== null) cancelAnimationFrame(this.scrollFrame);
+  }
+
+  private measureViewport() {
+    const el = this.viewportEl;
+    if (!el) return;
+    this.viewportTop.set(el.scrollTop);
+    this.viewportHeight.set(el.clientHeight);
+    this.viewportWidth.set(el.clientWidth);
+  }
+
+  private resetVirtualScroll() {
+    if (this.viewportEl) this.viewportEl.scrollTop = 0;
+    this.viewportTop.set(0);
   }
 
   onItemsPerPageChange(event: Event) {
@@ -172,12 +354,11 @@ export class AppComponent {
   }
 
   navigateViewer(direction: 'prev' | 'next') {
-    const current = this.viewingImage();
-    if (!current) return;
+    const currentIndex = this.viewingIndex();
+    if (currentIndex < 0) return;
 
     const filtered = this.filtered();
-    const currentIndex = filtered.findIndex(i => i.id === current.id);
-    
+
     if (direction === 'prev' && currentIndex > 0) {
       this.viewingImage.set(filtered[currentIndex - 1]);
     } else if (direction === 'next' && currentIndex < filtered.length - 1) {
@@ -189,26 +370,55 @@ export class AppComponent {
     this.loading.set(true);
     this.error.set(null);
     try {
-      // summary.json is exposed via assets mapping to ../downloads
-      const res = await fetch('assets/downloads/summary.json', { cache: 'no-cache' });
-      if (!res.ok) throw new Error(`HTTP ${res.status}`);
-      const summary: Summary = await res.json();
-
-      // Normalize items; build image path preferring saved filename
-      const mapped = (summary.items || []).map((it) => {
-        const imagePath = it.image_filename
-          ? `assets/downloads/images/${it.image_filename}`
-          : undefined;
-        return { ...it, image_filename: it.image_filename, image_url: imagePath ?? it.image_url } as SummaryItem;
-      }).filter(i => !!(i.image_filename || i.image_url));
-
-      this.items.set(mapped);
+      this.setItems(await this.fetchItems());
     } catch (e: any) {
       this.error.set(e?.message ?? 'Failed to load summary');
     } finally {
       this.loading.set(false);
     }
   }
+
+  // The service worker answers from its cache first and posts 'summary-updated' once
+  // the background revalidation found a newer summary
+  private readonly onServiceWorkerMessage = (event: MessageEvent) => {
+    if (event.data?.type === 'summary-updated') this.refresh();
+  };
+
+  private async refresh() {
+    try {
+      const fresh = await this.fetchItems();
+      // Keep the objects of unchanged items so rendered cards are not rebuilt
+      const current = this.itemsById();
+      this.setItems(fresh.map(item => {
+        const known = current.get(item.id);
+        return known && known.prompt === item.prompt && known.image_url === item.image_url ? known : item;
+      }));
+    } catch {
+      // Keep showing the cached library
+    }
+  }
+
+  private setItems(items: SummaryItem[]) {
+    this.items.set(items);
+    this.setSearchIndex(items);
+    // Re-run an active search against the new items
+    if (this.query().trim()) this.runSearch();
+  }
+
+  private async fetchItems(): Promise<SummaryItem[]> {
+    // summary.json is exposed via assets mapping to ../downloads
+    const res = await fetch('assets/downloads/summary.json', { cache: 'no-cache' });
+    if (!res.ok) throw new Error(`HTTP ${res.status}`);
+    const summary: Summary = await res.json();
+
+    // Normalize items; build image path preferring saved filename
+    return (summary.items || []).map((it) => {
+      const imagePath = it.image_filename
+        ? `assets/downloads/images/${it.image_filename}`
+        : undefined;
+      return { ...it, image_filename: it.image_filename, image_url: imagePath ?? it.image_url } as SummaryItem;
+    }).filter(i => !!(i.image_filename || i.image_url));
+  }
 }
 
 
@@ -0,0 +1,9 @@
+// Messages between AppComponent and search.worker.ts (kept apart from the worker so the
+// app compilation does not pull in the webworker lib)
+
+export type SearchRequest =
+  | { type: 'index'; items: { id: number; prompt?: string }[] }
+  | { type: 'query'; seq: number; query: string }
+  | { type: 'cancel'; seq: number };
+
+export type SearchResponse = { type: 'results'; seq: number; ids: number[]; done: boolean };
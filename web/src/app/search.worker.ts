@@ -0,0 +1,43 @@
+/// <reference lib="webworker" />
+
+import type { SearchRequest, SearchResponse } from './search-messages';
+
+// Prompt search off the UI thread. The app posts the item list once ('index'), then
+// queries; matches stream back in chunks and a newer query cancels the running one.
+
+// Prompts scanned between yields to the message loop (where newer queries arrive)
+const CHUNK_SIZE = 5000;
+
+let ids: number[] = [];
+let prompts: string[] = [];
+let latestSeq = 0;
+
+addEventListener('message', ({ data }: MessageEvent<SearchRequest>) => {
+  if (data.type === 'index') {
+    // Normalize once, not on every keystroke
+    ids = data.items.map(item => item.id);
+    prompts = data.items.map(item => (item.prompt || '').toLowerCase());
+  } else if (data.type === 'query') {
+    latestSeq = data.seq;
+    search(data.seq, data.query.toLowerCase().trim(), 0);
+  } else {
+    latestSeq = data.seq;
+  }
+});
+
+function search(seq: number, query: string, start: number) {
+  // A newer query arrived while we yielded
+  if (seq !== latestSeq) return;
+
+  const end = Math.min(start + CHUNK_SIZE, prompts.length);
+  const matches: number[] = [];
+  for (let i = start; i < end; i++) {
+    if (prompts[i].includes(query)) matches.push(ids[i]);
+  }
+
+  const done = end >= prompts.length;
+  if (matches.length || done || start === 0) {
+    postMessage({ type: 'results', seq, ids: matches, done } as SearchResponse);
+  }
+  if (!done) setTimeout(() => search(seq, query, end), 0);
+}
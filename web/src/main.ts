@@ -1,4 +1,5 @@
 import 'zone.js';
+import { isDevMode } from '@angular/core';
 import { bootstrapApplication } from '@angular/platform-browser';
 import { provideAnimations } from '@angular/platform-browser/animations';
 import { provideHttpClient } from '@angular/common/http';
@@ -12,3 +13,11 @@ bootstrapApplication(AppComponent, {
 }).catch(err => console.error(err));
 
 
+
+// Offline cache for the app shell, summary and images (skipped by `ng serve`, where it
+// would fight live reload)
+if (!isDevMode() && 'serviceWorker' in navigator) {
+  window.addEventListener('load', () => {
+    navigator.serviceWorker.register('sw.js').catch(err => console.error('Service worker registration failed', err));
+  });
+}
@@ -0,0 +1,196 @@
+// Offline cache for the gallery.
+//
+// - App shell (index.html, bundles, styles): precached, served from cache and refreshed in the
+//   background. Only this build's files are kept; a new build gets a new shell cache.
+// - summary.json: served from cache, revalidated in the background; open pages are told
+//   when it changed so they can merge the new items.
+// - Images: cache-first with an LRU cap, so only images not seen before hit the network.
+
+// Both filled in by scripts/stamp-sw.mjs after `ng build`: a hash of the shell files, and
+// the top-level build files (bundles, styles, favicon)
+const VERSION = 'dev';
+const SHELL_FILES = [];
+const SHELL_CACHE = `sora-shell-${VERSION}`;
+const DATA_CACHE = `sora-data-${VERSION}`;
+// Not versioned: images survive service worker updates
+const IMAGE_CACHE = 'sora-images';
+const META_CACHE = 'sora-meta';
+
+const SUMMARY_PATH = 'assets/downloads/summary.json';
+const IMAGES_PATH = 'assets/downloads/images/';
+const SHELL = ['./', 'index.html', ...SHELL_FILES];
+
+// LRU cap for cached images
+const MAX_IMAGE_BYTES = 512 * 1024 * 1024;
+const MAX_IMAGE_ENTRIES = 20000;
+const LRU_INDEX_URL = 'lru-index.json';
+const LRU_SAVE_DELAY_MS = 2000;
+
+const scope = new URL(self.registration.scope);
+const summaryUrl = new URL(SUMMARY_PATH, scope).href;
+const imagesPrefix = new URL(IMAGES_PATH, scope).href;
+const indexUrl = new URL('index.html', scope).href;
+const shellUrls = new Set(SHELL.map((path) => new URL(path, scope).href));
+
+self.addEventListener('install', (event) => {
+  event.waitUntil(
+    caches.open(SHELL_CACHE)
+      .then((cache) => cache.addAll(SHELL))
+      .then(() => caches.open(DATA_CACHE))
+      // The library may not exist yet; the shell still installs
+      .then((cache) => cache.add(SUMMARY_PATH).catch(() => undefined))
+      .then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener('activate', (event) => {
+  const keep = new Set([SHELL_CACHE, DATA_CACHE, IMAGE_CACHE, META_CACHE]);
+  event.waitUntil(
+    caches.keys()
+      .then((names) => Promise.all(names.filter((name) => !keep.has(name)).map((name) => caches.delete(name))))
+      .then(() => pruneShell())
+      .then(() => self.clients.claim())
+  );
+});
+
+self.addEventListener('fetch', (event) => {
+  const request = event.request;
+  if (request.method !== 'GET') return;
+  const url = new URL(request.url);
+  if (url.origin !== scope.origin) return;
+
+  const href = url.origin + url.pathname;
+  if (href === summaryUrl) {
+    event.respondWith(summaryResponse(event));
+  } else if (href.startsWith(imagesPrefix)) {
+    event.respondWith(imageResponse(event));
+  } else if (request.mode === 'navigate') {
+    event.respondWith(staleWhileRevalidate(event, SHELL_CACHE, indexUrl));
+  } else if (shellUrls.has(href)) {
+    // Keyed without the query string, so the cache holds one entry per shell file
+    event.respondWith(staleWhileRevalidate(event, SHELL_CACHE, href));
+  }
+});
+
+// Drop shell entries that are not part of this build (e.g. cached by an unstamped worker)
+async function pruneShell() {
+  const cache = await caches.open(SHELL_CACHE);
+  const requests = await cache.keys();
+  await Promise.all(requests
+    .filter((request) => {
+      const url = new URL(request.url);
+      return !shellUrls.has(url.origin + url.pathname);
+    })
+    .map((request) => cache.delete(request)));
+}
+
+// Serve the cached copy immediately and refresh the cache in the background
+async function staleWhileRevalidate(event, cacheName, key) {
+  const cache = await caches.open(cacheName);
+  const cached = await cache.match(key, { ignoreSearch: true });
+  const refresh = fetch(event.request)
+    .then(async (response) => {
+      if (response.ok) await cache.put(key, response.clone());
+      return response;
+    });
+  if (cached) {
+    event.waitUntil(refresh.catch(() => undefined));
+    return cached;
+  }
+  return refresh;
+}
+
+async function summaryResponse(event) {
+  const cache = await caches.open(DATA_CACHE);
+  const cached = await cache.match(SUMMARY_PATH);
+  // The browser revalidates with If-None-Match/If-Modified-Since, so an unchanged
+  // summary costs a 304 and no body
+  const refresh = fetch(SUMMARY_PATH, { cache: 'no-cache' })
+    .then(async (response) => {
+      if (!response.ok) return response;
+      const fresh = await response.clone().text();
+      const stale = cached ? await cached.clone().text() : null;
+      await cache.put(SUMMARY_PATH, response.clone());
+      if (stale !== null && fresh !== stale) await notifyClients({ type: 'summary-updated' });
+      return response;
+    });
+  if (cached) {
+    event.waitUntil(refresh.catch(() => undefined));
+    return cached;
+  }
+  return refresh;
+}
+
+// --- Images: cache-first with an LRU size cap -----------------------------
+
+// url -> { size, used }; persisted in META_CACHE because the Cache API has no access times
+let lru = null;
+let lruSaveTimer = null;
+
+async function loadLru() {
+  if (lru) return lru;
+  const meta = await caches.open(META_CACHE);
+  const stored = await meta.match(LRU_INDEX_URL);
+  lru = new Map(stored ? Object.entries(await stored.json()) : []);
+  return lru;
+}
+
+function scheduleLruSave(event) {
+  if (lruSaveTimer !== null) return;
+  event.waitUntil(new Promise((resolve) => {
+    lruSaveTimer = setTimeout(async () => {
+      lruSaveTimer = null;
+      const meta = await caches.open(META_CACHE);
+      await meta.put(LRU_INDEX_URL, new Response(JSON.stringify(Object.fromEntries(lru)),
+        { headers: { 'Content-Type': 'application/json' } }));
+      resolve();
+    }, LRU_SAVE_DELAY_MS);
+  }));
+}
+
+async function imageResponse(event) {
+  const request = event.request;
+  const key = request.url;
+  const [cache, index] = await Promise.all([caches.open(IMAGE_CACHE), loadLru()]);
+
+  const cached = await cache.match(key);
+  if (cached) {
+    const entry = index.get(key) || { size: 0 };
+    entry.used = Date.now();
+    index.set(key, entry);
+    scheduleLruSave(event);
+    return cached;
+  }
+
+  const response = await fetch(request);
+  // Opaque or partial responses (e.g. video range requests) are not cached
+  if (response.ok && response.status === 200) {
+    const size = Number(response.headers.get('Content-Length')) || (await response.clone().blob()).size;
+    event.waitUntil((async () => {
+      await cache.put(key, response.clone());
+      index.set(key, { size, used: Date.now() });
+      await evictImages(cache, index);
+      scheduleLruSave(event);
+    })());
+  }
+  return response;
+}
+
+async function evictImages(cache, index) {
+  let total = 0;
+  for (const entry of index.values()) total += entry.size;
+  if (total <= MAX_IMAGE_BYTES && index.size <= MAX_IMAGE_ENTRIES) return;
+
+  const oldestFirst = [...index.entries()].sort((a, b) => a[1].used - b[1].used);
+  for (const [key, entry] of oldestFirst) {
+    if (total <= MAX_IMAGE_BYTES && index.size <= MAX_IMAGE_ENTRIES) break;
+    await cache.delete(key);
+    index.delete(key);
+    total -= entry.size;
+  }
+}
+
+async function notifyClients(message) {
+  const clients = await self.clients.matchAll({ type: 'window' });
+  clients.forEach((client) => client.postMessage(message));
+}
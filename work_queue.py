@@ -0,0 +1,165 @@
+"""
+Work Queue
+Durable SQLite-backed queue of detail page URLs shared by discovery and worker processes
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import time
+
+
+class WorkQueue:
+    """Lease-based work queue stored in a single SQLite file.
+
+    Discovery publishes detail URLs; any number of workers lease items with a
+    visibility timeout, process them and report results. Leases that are not
+    completed before they expire become visible to other workers again.
+    """
+
+    def __init__(self, path, visibility_timeout=300, max_attempts=3):
+        self.path = str(path)
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        # isolation_level=None: we manage transactions explicitly (BEGIN IMMEDIATE)
+        self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS items (
+                id INTEGER PRIMARY KEY,
+                detail_url TEXT NOT NULL UNIQUE,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                updated_at REAL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS items_status ON items (status, lease_expires)')
+
+    @staticmethod
+    def default_worker_id():
+        """Identify this worker as host:pid"""
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def close(self):
+        self.conn.close()
+
+    def publish(self, detail_urls):
+        """Add detail URLs to the queue; already known URLs keep their id and state.
+
+        Returns the number of newly added items.
+        """
+        now = time.time()
+        added = 0
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            next_id = self.conn.execute('SELECT COALESCE(MAX(id) + 1, 0) FROM items').fetchone()[0]
+            for url in detail_urls:
+                cur = self.conn.execute(
+                    'INSERT OR IGNORE INTO items (id, detail_url, updated_at) VALUES (?, ?, ?)',
+                    (next_id, url, now)
+                )
+                if cur.rowcount:
+                    next_id += 1
+                    added += 1
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return added
+
+    def requeue(self, items):
+        """Make items (dicts with detail_url and optionally id) pending again for re-processing.
+
+        Unknown URLs are added, reusing the given id when it is free. Returns the number requeued.
+        """
+        now = time.time()
+        requeued = 0
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            for item in items:
+                cur = self.conn.execute('''
+                    UPDATE items SET status = 'pending', attempts = 0, worker = NULL,
+                                     lease_expires = NULL, error = NULL, updated_at = ?
+                    WHERE detail_url = ?
+                ''', (now, item['detail_url']))
+                if not cur.rowcount:
+                    item_id = item.get('id')
+                    if item_id is None or self.conn.execute('SELECT 1 FROM items WHERE id = ?', (item_id,)).fetchone():
+                        item_id = self.conn.execute('SELECT COALESCE(MAX(id) + 1, 0) FROM items').fetchone()[0]
+                    self.conn.execute('INSERT INTO items (id, detail_url, updated_at) VALUES (?, ?, ?)',
+                                      (item_id, item['detail_url'], now))
+                requeued += 1
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return requeued
+
+    def lease(self, worker_id):
+        """Lease the next available item, or return None if nothing is available"""
+        now = time.time()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = self.conn.execute('''
+                SELECT id, detail_url, attempts FROM items
+                WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+                ORDER BY id LIMIT 1
+            ''', (now,)).fetchone()
+            if row is None:
+                self.conn.execute('COMMIT')
+                return None
+            self.conn.execute('''
+                UPDATE items SET status = 'leased', worker = ?, lease_expires = ?,
+                                 attempts = attempts + 1, updated_at = ?
+                WHERE id = ?
+            ''', (worker_id, now + self.visibility_timeout, now, row['id']))
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return {'id': row['id'], 'detail_url': row['detail_url'], 'attempts': row['attempts'] + 1}
+
+    def complete(self, item_id, worker_id, result):
+        """Store the result of a leased item. Returns False if the lease was lost."""
+        cur = self.conn.execute('''
+            UPDATE items SET status = 'done', result = ?, error = NULL,
+                             lease_expires = NULL, updated_at = ?
+            WHERE id = ? AND status = 'leased' AND worker = ?
+        ''', (json.dumps(result, ensure_ascii=False), time.time(), item_id, worker_id))
+        return cur.rowcount == 1
+
+    def fail(self, item_id, worker_id, error, result=None):
+        """Release a leased item for retry, or mark it failed after max_attempts"""
+        self.conn.execute('''
+            UPDATE items SET
+                status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                result = ?, error = ?, lease_expires = NULL, updated_at = ?
+            WHERE id = ? AND status = 'leased' AND worker = ?
+        ''', (self.max_attempts, json.dumps(result, ensure_ascii=False) if result else None,
+              str(error), time.time(), item_id, worker_id))
+
+    def outstanding(self):
+        """Number of items that are pending or currently leased"""
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM items WHERE status IN ('pending', 'leased')"
+        ).fetchone()[0]
+
+    def stats(self):
+        """Item counts per status"""
+        rows = self.conn.execute('SELECT status, COUNT(*) FROM items GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
+
+    def results(self):
+        """Yield stored results in id order (failed items included with their last partial result)"""
+        for row in self.conn.execute(
+            "SELECT id, detail_url, result FROM items WHERE status IN ('done', 'failed') ORDER BY id"
+        ):
+            if row['result']:
+                yield json.loads(row['result'])
+            else:
+                yield {'id': row['id'], 'detail_url': row['detail_url'], 'prompt': '', 'image_filename': ''}